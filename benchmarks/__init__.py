@@ -0,0 +1,3 @@
+from .run_benchmarks import run_benchmarks, compare_results
+
+__all__ = ['run_benchmarks', 'compare_results']
@@ -0,0 +1,59 @@
+# Runs all benchmarks, writes the results as JSON and compares them against a stored baseline
+#   python -m benchmarks --output results.json
+# Exits with status 1 if any result is more than --tolerance worse than the baseline
+# Results depend on the machine: update the baseline (--update-baseline) on the machine the comparison runs on
+
+import argparse
+import json
+import os
+import sys
+
+from .run_benchmarks import BASELINE_PATH, TOLERANCE, compare_results, get_metadata, run_benchmarks
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the benchmarks and compare them against a baseline')
+    parser.add_argument('--output', help='path of the JSON file to write the results to')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='path of the baseline JSON file')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help='allowed relative slowdown')
+    parser.add_argument('--update-baseline', action='store_true', help='write the results to the baseline file')
+    parser.add_argument('--quick', action='store_true', help='shorter run, e.g. as a smoke test')
+    args = parser.parse_args()
+
+    report = {'metadata': get_metadata(), 'results': run_benchmarks(quick=args.quick)}
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.update_baseline:
+        # Results of benchmarks that didn't run (e.g. the full run's memory benchmark with --quick) are kept
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                report['results'] = {**json.load(f)['results'], **report['results']}
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'Baseline written to {args.baseline}')
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f'No baseline at {args.baseline}')
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)['results']
+
+    changes, regressions, missing = compare_results(report['results'], baseline, args.tolerance)
+    print(f'\nChange against baseline (positive = better, tolerance {args.tolerance:.0%}):')
+    for name, change in changes.items():
+        flag = '  REGRESSION' if name in regressions else ''
+        print(f'{name:<45} {change:>+8.1%}{flag}')
+    for name in missing:
+        print(f'{name:<45} {"no baseline":>8}')
+
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
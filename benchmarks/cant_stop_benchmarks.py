@@ -0,0 +1,129 @@
+from functools import partial
+import tracemalloc
+
+from environments.cant_stop import CantStopEnv
+from environments.cant_stop.cant_stop_tables import (
+    encode_action, get_distinct_legal_moves, get_legal_action_mask, get_legal_moves
+)
+from experiments.cant_stop.tournament import run_shard
+from policies.cant_stop import CantStopRandomPolicy, StopAfterNRollsPolicy
+from .timing import measure_rate
+
+
+PLAYER_COUNTS = [2, 3, 4]
+
+# Games with smaller n (and random games) take many more rolls to finish
+STOP_AFTER_N = 12
+
+# Environment configurations for stepping: the defaults, and everything turned off that simulations don't need
+ENV_CONFIGS = {
+    'default': dict(),
+    'fast': dict(action_mode='discrete', observation_mode='flat', history_mode='none', check_actions=False),
+}
+
+
+def record_game(seed=0):
+    # Start state (including the dice to come) and actions of a 2-player game, so that the game can be
+    # replayed without a policy
+    env = CantStopEnv(num_players=2, history_mode='none')
+    env.reset(seed=seed)
+    start = env.get_state(include_rng=True)
+
+    policies = [StopAfterNRollsPolicy(STOP_AFTER_N, seed=seed + p) for p in range(2)]
+    actions = []
+    while env.winner is None:
+        action = policies[env.current_player].select_action(env.get_possible_actions())
+        actions.append(action)
+        env.step(action)
+
+    return start, actions
+
+
+def benchmark_step(min_time=1.0):
+    # Steps / second of CantStopEnv.step, replaying a recorded game
+    start, actions = record_game()
+    results = {}
+    for name, config in ENV_CONFIGS.items():
+        env = CantStopEnv(num_players=2, **config)
+        if env.action_mode == 'discrete':
+            env_actions = [encode_action(*action) for action in actions]
+        else:
+            env_actions = actions
+
+        def replay_game():
+            env.reset()
+            env.set_state(start)
+            for action in env_actions:
+                env.step(action)
+            return len(env_actions)
+
+        results[f'cant_stop.step.{name}'] = (measure_rate(replay_game, min_time), 'steps/s')
+    return results
+
+
+def benchmark_get_possible_actions(min_time=1.0):
+    # Calls / second of get_possible_actions on the states of a recorded game
+    # Every call follows a set_state, so legal moves are looked up again instead of taken from the per-state cache
+    start, actions = record_game()
+    env = CantStopEnv(num_players=2, history_mode='none')
+    env.set_state(start)
+    states = []
+    for action in actions:
+        states.append(env.get_state())
+        env.step(action)
+
+    results = {}
+    for action_mode in ['tuple', 'discrete']:
+        env = CantStopEnv(num_players=2, action_mode=action_mode, history_mode='none')
+
+        def get_possible_actions():
+            for state in states:
+                env.set_state(state)
+                env.get_possible_actions()
+            return len(states)
+
+        results[f'cant_stop.get_possible_actions.{action_mode}'] = (measure_rate(get_possible_actions, min_time), 'calls/s')
+    return results
+
+
+def benchmark_games(repeats=3):
+    # Games / second played with CantStopEnv.simulate_game, for every player count
+    # Every repeat plays the same seeded games, as game lengths vary a lot
+    policy_factories = {
+        'random': CantStopRandomPolicy,
+        f'stop_after_{STOP_AFTER_N}': partial(StopAfterNRollsPolicy, STOP_AFTER_N),
+    }
+
+    results = {}
+    for name, factory in policy_factories.items():
+        # Random games take seconds each
+        num_games = 2 if name == 'random' else 50
+        for num_players in PLAYER_COUNTS:
+            env = CantStopEnv(num_players=num_players, history_mode='none', check_actions=False)
+
+            def play_games():
+                policies = [factory(seed=p) for p in range(num_players)]
+                for seed in range(num_games):
+                    env.simulate_game(policies, seed=seed)
+                return num_games
+
+            rate = measure_rate(play_games, min_time=0, repeats=repeats)
+            results[f'cant_stop.games.{name}.{num_players}p'] = (rate, 'games/s')
+    return results
+
+
+def benchmark_memory(num_games=10_000):
+    # Peak memory allocated (tracemalloc) while playing num_games games as a tournament shard
+    # The legal move caches are emptied first, so the result doesn't depend on the benchmarks run before
+    policy_factories = [partial(StopAfterNRollsPolicy, STOP_AFTER_N)] * 2
+    for cached_function in [get_legal_moves, get_distinct_legal_moves, get_legal_action_mask]:
+        cached_function.cache_clear()
+
+    tracemalloc.start()
+    try:
+        run_shard(0, policy_factories, seed=0, num_games=num_games)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {f'cant_stop.peak_memory.{num_games}_games': (peak / 2 ** 20, 'MB')}
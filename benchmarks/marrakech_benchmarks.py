@@ -0,0 +1,92 @@
+import numpy as np
+
+from environments.marrakech import MarrakechEnv
+from .timing import measure_rate
+
+
+NUM_SAMPLES = 10_000
+
+
+def benchmark_move_assam(min_time=1.0):
+    # Moves / second of MarrakechEnv._move_assam, with die rolls drawn like MarrakechEnv._roll_die
+    env = MarrakechEnv()
+    rolls = np.random.default_rng(0).choice([1, 2, 3, 4], size=NUM_SAMPLES, p=[1/6, 1/3, 1/3, 1/6]).tolist()
+
+    def move_assam():
+        for roll in rolls:
+            env._move_assam(roll)
+        return len(rolls)
+
+    return {'marrakech.move_assam': (measure_rate(move_assam, min_time), 'moves/s')}
+
+
+def benchmark_rug_pos_candidates(min_time=1.0):
+    # Calls / second of MarrakechEnv.get_rug_pos_candidates, for random positions of Assam
+    env = MarrakechEnv()
+    positions = np.random.default_rng(0).integers(0, env.board_size, size=(NUM_SAMPLES, 2)).tolist()
+
+    def get_rug_pos_candidates():
+        for position in positions:
+            env.assam_pos = position
+            env.get_rug_pos_candidates()
+        return len(positions)
+
+    return {'marrakech.rug_pos_candidates': (measure_rate(get_rug_pos_candidates, min_time), 'calls/s')}
+
+
+def benchmark_legal_rug_placements(min_time=1.0):
+    # Calls / second of MarrakechEnv.get_legal_rug_placements, for random positions of Assam on a board with rugs
+    env = MarrakechEnv()
+    rng = np.random.default_rng(0)
+    for turn in range(2 * env.num_rugs):
+        env.assam_pos = rng.integers(0, env.board_size, size=2).tolist()
+        placements = env.get_legal_rug_placements()
+        env.place_rug(turn % env.num_players, placements[rng.integers(len(placements))])
+    positions = rng.integers(0, env.board_size, size=(NUM_SAMPLES, 2)).tolist()
+
+    def get_legal_rug_placements():
+        for position in positions:
+            env.assam_pos = position
+            env.get_legal_rug_placements()
+        return len(positions)
+
+    return {'marrakech.legal_rug_placements': (measure_rate(get_legal_rug_placements, min_time), 'calls/s')}
+
+
+
+def benchmark_payment(min_time=1.0):
+    # Calls / second of MarrakechEnv.get_payment, for random positions of Assam on a board with rugs
+    env = MarrakechEnv(num_players=4)
+    rng = np.random.default_rng(0)
+    for turn in range(4 * env.num_rugs):
+        env.assam_pos = rng.integers(0, env.board_size, size=2).tolist()
+        placements = env.get_legal_rug_placements()
+        env.place_rug(turn % env.num_players, placements[rng.integers(len(placements))])
+    positions = rng.integers(0, env.board_size, size=(NUM_SAMPLES, 2)).tolist()
+    players = rng.integers(0, env.num_players, size=NUM_SAMPLES).tolist()
+
+    def get_payment():
+        for position, player in zip(positions, players):
+            env.assam_pos = position
+            env.get_payment(player)
+        return len(positions)
+
+    return {'marrakech.payment': (measure_rate(get_payment, min_time), 'calls/s')}
+
+
+def benchmark_marrakech_games(num_games=20, repeats=3):
+    # Steps / second of 3-player MarrakechEnv games with random legal actions, the same seeded games every repeat
+    env = MarrakechEnv(num_players=3)
+
+    def play_games():
+        rng = np.random.default_rng(0)
+        steps = 0
+        for seed in range(num_games):
+            env.reset(seed=seed)
+            while env.winner is None:
+                actions = env.get_possible_actions()
+                env.step(actions[rng.integers(len(actions))])
+                steps += 1
+        return steps
+
+    return {'marrakech.step.random': (measure_rate(play_games, min_time=0, repeats=repeats), 'steps/s')}
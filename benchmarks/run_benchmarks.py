@@ -0,0 +1,80 @@
+from datetime import datetime, timezone
+import os
+import platform
+
+import numpy as np
+
+from .cant_stop_benchmarks import (
+    benchmark_games, benchmark_get_possible_actions, benchmark_memory, benchmark_step
+)
+from .marrakech_benchmarks import (
+    benchmark_legal_rug_placements, benchmark_marrakech_games, benchmark_move_assam, benchmark_payment,
+    benchmark_rug_pos_candidates
+)
+from .timing import measure_import_time
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+TOLERANCE = 0.25
+
+IMPORTED_MODULES = ['environments.cant_stop', 'environments.marrakech']
+
+# Units of results for which lower values are better, all other units are rates
+LOWER_IS_BETTER_UNITS = {'s', 'MB'}
+
+
+def run_benchmarks(quick=False, verbose=True):
+    # Dict of benchmark name -> {'value': ..., 'unit': ...}
+    # quick: shorter timings, fewer repeats and fewer games for the memory benchmark (its result gets a different name)
+    min_time = 0.2 if quick else 1.0
+    benchmarks = [
+        lambda: benchmark_step(min_time),
+        lambda: benchmark_get_possible_actions(min_time),
+        lambda: benchmark_games(repeats=1 if quick else 3),
+        lambda: benchmark_memory(num_games=1_000 if quick else 10_000),
+        lambda: benchmark_move_assam(min_time),
+        lambda: benchmark_rug_pos_candidates(min_time),
+        lambda: benchmark_legal_rug_placements(min_time),
+        lambda: benchmark_payment(min_time),
+        lambda: benchmark_marrakech_games(repeats=1 if quick else 3),
+        lambda: {f'import.{module}': (measure_import_time(module), 's') for module in IMPORTED_MODULES},
+    ]
+
+    results = {}
+    for benchmark in benchmarks:
+        for name, (value, unit) in benchmark().items():
+            results[name] = {'value': value, 'unit': unit}
+            if verbose:
+                print(f'{name:<45} {value:>14,.3f} {unit}')
+    return results
+
+
+def compare_results(results, baseline, tolerance=TOLERANCE):
+    # Relative change of every result that is also in the baseline (positive = better), the names of
+    # the results that are more than tolerance worse and the names of the results without baseline entry
+    changes = {}
+    regressions = []
+    missing = []
+    for name, result in results.items():
+        if name not in baseline:
+            missing.append(name)
+            continue
+        baseline_value = baseline[name]['value']
+        change = result['value'] / baseline_value - 1
+        if result['unit'] in LOWER_IS_BETTER_UNITS:
+            change = baseline_value / result['value'] - 1
+        changes[name] = change
+        if change < -tolerance:
+            regressions.append(name)
+    return changes, regressions, missing
+
+
+def get_metadata():
+    return {
+        'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'system': platform.system(),
+    }
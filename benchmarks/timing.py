@@ -0,0 +1,34 @@
+import os
+import subprocess
+import sys
+import time
+
+
+def measure_rate(run, min_time=1.0, repeats=3):
+    # Best rate (units / second) over several repeats
+    # run() does some work and returns the number of units (steps, games, ...) it did;
+    # every repeat calls it until min_time has passed
+    best_rate = 0.0
+    for _ in range(repeats):
+        units = 0
+        start = time.perf_counter()
+        while True:
+            units += run()
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                break
+        best_rate = max(best_rate, units / elapsed)
+    return best_rate
+
+
+def measure_import_time(module, repeats=5):
+    # Best time (seconds) to import module in a fresh interpreter
+    code = f'import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)'
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=repo_root)
+
+    import_times = []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, check=True).stdout
+        import_times.append(float(output))
+    return min(import_times)
@@ -1,4 +1,21 @@
-from .marrakech.marrakech_env import MarrakechEnv
-from .cant_stop.cant_stop_env import CantStopEnv, CantStopActionSpace
+from importlib import import_module
 
-__all__ = ['MarrakechEnv', 'CantStopEnv', 'CantStopActionSpace']
\ No newline at end of file
+# Environments are imported lazily, so that e.g. `from environments.cant_stop import CantStopEnv`
+# only loads the Can't Stop environment
+_exports = {
+    'MarrakechEnv': '.marrakech.marrakech_env',
+    'CantStopEnv': '.cant_stop.cant_stop_env',
+    'CantStopActionSpace': '.cant_stop.cant_stop_env',
+    'CantStopBatchEnv': '.cant_stop.cant_stop_batch_env',
+    'ReplayReader': '.cant_stop.cant_stop_replay',
+    'ReplayWriter': '.cant_stop.cant_stop_replay',
+}
+
+
+def __getattr__(name):
+    if name in _exports:
+        return getattr(import_module(_exports[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = ['MarrakechEnv', 'CantStopEnv', 'CantStopActionSpace', 'CantStopBatchEnv', 'ReplayReader', 'ReplayWriter']
\ No newline at end of file
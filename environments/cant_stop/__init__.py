@@ -1,3 +1,5 @@
 from .cant_stop_env import CantStopEnv, CantStopActionSpace
+from .cant_stop_batch_env import CantStopBatchEnv
+from .cant_stop_replay import ReplayReader, ReplayWriter
 
-__all__ = ['CantStopEnv', 'CantStopActionSpace']
\ No newline at end of file
+__all__ = ['CantStopEnv', 'CantStopActionSpace', 'CantStopBatchEnv', 'ReplayReader', 'ReplayWriter']
\ No newline at end of file
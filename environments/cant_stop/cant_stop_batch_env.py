@@ -0,0 +1,247 @@
+import numpy as np
+
+from .cant_stop_state import COLUMN_TOPS
+from .cant_stop_tables import MOVE_INDEX, MOVE_STEPS, NUM_ACTIONS, NUM_MOVES, ROLLS, ROLL_INDEX, ROLL_PAIR_SUMS
+
+
+class CantStopBatchEnv:
+    # Vectorized counterpart to CantStopEnv: holds num_games independent games as stacked arrays.
+    # Games that have terminated are frozen until they are reset with reset_batch.
+    def __init__(self, num_games, num_players=3):
+        assert num_games >= 1, 'num_games has to be 1 or larger'
+        self.num_games = num_games
+        self.num_players = num_players
+        self.games = np.arange(num_games)
+
+        # Marker positions, -1 = no marker
+        self.player_markers = np.full(shape=(num_games, num_players, 11), fill_value=-1, dtype=np.int8)
+        self.tmp_markers = np.full(shape=(num_games, 11), fill_value=-1, dtype=np.int8)
+        self.current_player = np.zeros(shape=num_games, dtype=np.int64)
+        self.dice = np.zeros(shape=(num_games, 4), dtype=np.int8)
+        self.roll = np.zeros(shape=num_games, dtype=np.int64)
+        self.winner = np.full(shape=num_games, fill_value=-1, dtype=np.int64)
+        self.done = np.zeros(shape=num_games, dtype=bool)
+        self.turn = np.zeros(shape=num_games, dtype=np.int64)
+        self.move = np.zeros(shape=num_games, dtype=np.int64)
+        self.legal_moves = np.zeros(shape=(num_games, NUM_MOVES), dtype=bool)
+
+        self.rng = np.random.default_rng()
+
+        self.reset_batch()
+
+    def reset_batch(self, seed=None, games=None):
+        # Reset all games, or only the games selected by the boolean mask / index array `games`
+        if seed is not None:
+            self.rng = np.random.default_rng(seed)
+
+        self._reset_games(self.games if games is None else self.games[games])
+        return self._get_observation(), self._get_info()
+
+    def _reset_games(self, games):
+        self.player_markers[games] = -1
+        self.tmp_markers[games] = -1
+        self.current_player[games] = self.rng.integers(0, self.num_players, size=len(games))
+        self.winner[games] = -1
+        self.done[games] = False
+        self.turn[games] = 0
+        self.move[games] = 0
+
+        self._roll_dice(games)
+        self._update_legal_moves(games)
+
+    def step_batch(self, actions):
+        # Apply one action per game; actions for games that are already done are ignored
+        actions = np.asarray(actions, dtype=np.int64)
+        assert actions.shape == (self.num_games,), 'One action per game is required'
+        assert ((actions >= 0) & (actions < NUM_ACTIONS)).all(), 'Invalid action'
+
+        games = self.games[~self.done]
+        game_rewards, game_terminated = self._play_actions(games, actions[games])
+
+        rewards = np.zeros(shape=self.num_games, dtype=np.float64)
+        rewards[games] = game_rewards
+        terminated = np.zeros(shape=self.num_games, dtype=bool)
+        terminated[games] = game_terminated
+        truncated = np.zeros(shape=self.num_games, dtype=bool)
+        return self._get_observation(), rewards, terminated, truncated, self._get_info()
+
+    def simulate_batch(self, policies, num_games=None, seed=None):
+        # Reset all games and play num_games games (default: one per game slot of the batch) to the end,
+        # policies[p] choosing the actions of player p
+        # Policies are batched (select_actions(obs_batch, legal_mask_batch, games)), each one is called once per step
+        # with the games in which its player is to move
+        # With num_games > self.num_games, a slot starts the next game as soon as its game has ended, so the batch
+        # stays full until the last games; only running games are stepped
+        # Returns the winners of the games, in the order the games were started
+        num_games = num_games or self.num_games
+        assert len(policies) == self.num_players, 'One policy per player is required'
+        assert num_games >= self.num_games, 'num_games has to be at least the number of games of the batch'
+        self.reset_batch(seed=seed)
+        for policy in policies:
+            policy.reset(self.num_games)
+
+        winners = np.full(shape=num_games, fill_value=-1, dtype=np.int64)
+        slot_games = self.games.copy() # Number of the game played in each slot
+        next_game = self.num_games
+        running = self.games
+        while len(running) > 0:
+            actions = np.empty(shape=len(running), dtype=np.int64)
+            players = self.current_player[running]
+            for player, policy in enumerate(policies):
+                selected = players == player
+                if not selected.any():
+                    continue
+                games = running[selected]
+                actions[selected] = policy.select_actions(
+                    self._get_observation(games), self._get_action_mask(games), games
+                )
+            _, terminated = self._play_actions(running, actions)
+            if not terminated.any():
+                continue
+
+            finished = running[terminated]
+            winners[slot_games[finished]] = self.winner[finished]
+            restart = finished[:num_games - next_game]
+            if len(restart) > 0:
+                slot_games[restart] = np.arange(next_game, next_game + len(restart))
+                next_game += len(restart)
+                self._reset_games(restart)
+                for policy in policies:
+                    policy.reset(self.num_games, restart)
+                terminated[np.flatnonzero(terminated)[:len(restart)]] = False
+            running = running[~terminated]
+
+        return winners
+
+    def _play_actions(self, games, actions):
+        # Apply actions to the running games with indices games, only these games are touched
+        # Returns the rewards (same as CantStopEnv: -1 for busting, 0 otherwise) and whether each game has ended
+        moves = (actions + 1) // 2
+        continue_flags = actions % 2 == 1
+        assert self.legal_moves[games, moves].all(), 'Impossible move'
+
+        bust = moves == 0
+        advance = ~bust
+        stop = advance & ~continue_flags
+
+        rewards = np.zeros(shape=len(games), dtype=np.float64)
+        rewards[bust] = -1
+
+        # Move tmp markers (a column without tmp marker starts at -1 + 1 = 0), never past the final slot
+        advance_games = games[advance]
+        self.tmp_markers[advance_games] = np.minimum(
+            self.tmp_markers[advance_games] + MOVE_STEPS[moves[advance]], COLUMN_TOPS
+        )
+
+        # Set positions of tmp markers to marker positions of current player
+        stop_games = games[stop]
+        stop_players = self.current_player[stop_games]
+        tmp = self.tmp_markers[stop_games]
+        markers = self.player_markers[stop_games, stop_players]
+        markers = np.where(tmp >= 0, tmp, markers)
+        self.player_markers[stop_games, stop_players] = markers
+
+        # Check if the player who stopped has 3 columns complete
+        won = (markers == COLUMN_TOPS).sum(axis=1) >= 3
+        self.winner[stop_games[won]] = stop_players[won]
+        self.done[stop_games[won]] = True
+        terminated = np.zeros(shape=len(games), dtype=bool)
+        terminated[np.flatnonzero(stop)[won]] = True
+
+        # Reset tmp markers after busting or stopping
+        self.tmp_markers[games[bust | stop]] = -1
+
+        # Switch to next player
+        switch_games = games[(bust | stop) & ~terminated]
+        self.current_player[switch_games] = (self.current_player[switch_games] + 1) % self.num_players
+        self.turn[switch_games] += 1
+        self.move[games[advance & continue_flags]] += 1
+        self.move[switch_games] = 0
+
+        # Roll dice for all games that are still running
+        running = games[~terminated]
+        self._roll_dice(running)
+        self._update_legal_moves(running)
+
+        return rewards, terminated
+
+    def get_legal_action_mask(self):
+        # Boolean mask of shape (num_games, NUM_ACTIONS)
+        mask = self._get_action_mask(self.games)
+        mask[self.done] = False
+        return mask
+
+    def _get_action_mask(self, games):
+        # Action mask of the games with indices games, from their legal moves
+        legal_moves = self.legal_moves[games]
+        mask = np.empty(shape=(len(games), NUM_ACTIONS), dtype=bool)
+        mask[:, 0] = legal_moves[:, 0]
+        mask[:, 1::2] = legal_moves[:, 1:]
+        mask[:, 2::2] = legal_moves[:, 1:]
+        return mask
+
+    def _roll_dice(self, games):
+        # Roll 4 dice for each game, drawn as one of the 1296 ordered rolls and looked up as sorted roll
+        roll = ROLL_INDEX[self.rng.integers(0, len(ROLL_INDEX), size=len(games))]
+        self.roll[games] = roll
+        self.dice[games] = ROLLS[roll]
+
+    def _update_legal_moves(self, games):
+        n = len(games)
+        if n == 0:
+            return
+
+        # Pair sums for the three pairings, shape (n, 3, 2), sorted within each pair
+        sums = ROLL_PAIR_SUMS[self.roll[games]]
+
+        tmp = self.tmp_markers[games]
+        # A column is blocked if any player or the tmp marker has reached its top
+        blocked = (self.player_markers[games] == COLUMN_TOPS).any(axis=1) | (tmp == COLUMN_TOPS)
+        in_tmp = (tmp >= 0) & ~blocked
+        free_tmp_markers = 3 - (tmp >= 0).sum(axis=1)
+
+        rows = np.arange(n)[:, None]
+        a, b = sums[:, :, 0], sums[:, :, 1]
+        a_available, b_available = ~blocked[rows, a - 2], ~blocked[rows, b - 2]
+        a_tmp, b_tmp = in_tmp[rows, a - 2], in_tmp[rows, b - 2]
+
+        # Number of new tmp markers the full pair would need
+        a_new = a_available & ~a_tmp
+        b_new = b_available & ~b_tmp & ~((a == b) & a_new)
+        new_markers = a_new.astype(np.int64) + b_new
+
+        free = free_tmp_markers[:, None]
+        # If no more tmp markers are available, only columns that are in tmp columns can be moved on
+        use_a = np.where(free == 0, a_available & a_tmp, a_available)
+        use_b = np.where(free == 0, b_available & b_tmp, b_available)
+        # If only 1 free tmp marker but two new columns, each column can be moved on individually
+        split = (free > 0) & (new_markers > free)
+
+        full = np.where(use_a & use_b, MOVE_INDEX[a, b], np.where(use_a, MOVE_INDEX[a, 0], np.where(use_b, MOVE_INDEX[b, 0], 0)))
+        candidates = np.concatenate([
+            np.where(split, MOVE_INDEX[a, 0], full),
+            np.where(split, MOVE_INDEX[b, 0], 0),
+        ], axis=1)
+
+        legal_moves = np.zeros(shape=(n, NUM_MOVES), dtype=bool)
+        legal_moves[rows, candidates] = True
+        # Bust if no moves are possible
+        legal_moves[:, 0] = ~legal_moves[:, 1:].any(axis=1)
+        self.legal_moves[games] = legal_moves
+
+    def _get_observation(self, games=None):
+        # Observation of all games, or of the games with indices games
+        if games is None:
+            games = self.games
+        return {
+            'player_markers': self.player_markers[games],
+            'tmp_markers': self.tmp_markers[games],
+            'current_player': self.current_player[games],
+            'dice': self.dice[games]
+        }
+
+    def _get_info(self):
+        return {
+            'action_mask': self.get_legal_action_mask(),
+            'winner': self.winner.copy()
+        }
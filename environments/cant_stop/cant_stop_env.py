@@ -1,13 +1,29 @@
 import gymnasium as gym
 from gymnasium import spaces
 
-import colorama
-from colorama import Fore, Back, Style
-from IPython.display import display, HTML
 import numpy as np
-import pandas as pd
 import sys
 
+# colorama, IPython and pandas are only imported when rendering or building stats,
+# so headless simulations don't pay for loading them
+
+from .cant_stop_history import ColumnarHistory, NullHistory, RingHistory
+from .cant_stop_profile import CantStopProfile, PROFILE_PHASES, PROFILED_METHODS
+from .cant_stop_state import CantStopState, COLUMN_TOPS
+from .cant_stop_stats import CantStopStats
+from .cant_stop_tables import (
+    ALL_COLUMNS, MAX_PLAYERS, ROLLS, ROLL_COLUMNS, ROLL_INDEX, NUM_ACTIONS, NO_ACTIONS,
+    ZOBRIST_CURRENT_PLAYER, ZOBRIST_PLAYER_MARKERS, ZOBRIST_TMP_MARKERS, decode_action, get_distinct_legal_moves, get_legal_action_mask, get_legal_moves, roll_code
+)
+
+# Version of the game simulation: bump it whenever a change makes seeded games play out differently
+# (rules, dice drawing, move order), so stored experiment results (see experiments.cant_stop.ResultStore)
+# are not mixed with results of the previous version and cached probability tables are recomputed
+ENV_VERSION = 1
+
+# Dice are drawn from the environment's np_random in blocks of this many rolls
+DICE_BLOCK_SIZE = 4096
+
 
 class CantStopActionSpace(gym.Space):
     def __init__(self):
@@ -23,14 +39,14 @@ class CantStopActionSpace(gym.Space):
         # 3: Advance on one column and continue
         # 4: Advance on one column and stop
         # 5: Do not advance (because no combinations are possible) and bust
-        action_type = np.random.choice([1, 2, 3, 4, 5])
+        action_type = self.np_random.choice([1, 2, 3, 4, 5])
 
         if action_type in [1, 2]:
-            columns = tuple(sorted(np.random.choice(range(2, 13), size=2)))
+            columns = tuple(sorted(self.np_random.choice(range(2, 13), size=2)))
             continue_flag = action_type == 1
 
         elif action_type in [3, 4]:
-            columns = (np.random.choice(range(2, 13)),)
+            columns = (self.np_random.choice(range(2, 13)),)
             continue_flag = action_type == 3
 
         else:
@@ -59,12 +75,35 @@ class CantStopActionSpace(gym.Space):
 
 
 class CantStopEnv(gym.Env):
-    def __init__(self, num_players=3):
+    # action_mode:
+    #   'tuple': actions are (columns, continue_flag) tuples, see CantStopActionSpace
+    #   'discrete': actions are integers (see cant_stop_tables.decode_action), the info dict
+    #               carries the boolean mask of legal actions under 'action_mask'
+    # observation_mode:
+    #   'dict': nested dicts of marker positions (None = no marker)
+    #   'array': dict of fixed-shape int8 arrays (-1 = no marker, current player one-hot)
+    #   'flat': the arrays of 'array' concatenated into a single int8 vector
+    # In 'array' and 'flat' mode observations are written into preallocated arrays, which are
+    # overwritten on the next step (vector envs copy them, e.g. into shared memory)
+    # history_mode:
+    #   'full': list of actions and dict of all observations
+    #   'none': nothing is recorded
+    #   'ring': the last history_capacity actions, in NumPy arrays (see cant_stop_history)
+    #   'columnar': all actions, in NumPy arrays that grow as needed
+    # check_actions: validate every action passed to step; can be turned off for speed when actions are
+    #   known to be legal (e.g. taken from get_possible_actions)
+    # profile: time every phase of a step (see cant_stop_profile and get_profile); without it, no timing code runs
+    def __init__(self, num_players=3, action_mode='tuple', observation_mode='dict', history_mode='full',
+                 history_capacity=1024, check_actions=True, profile=False):
         super(CantStopEnv, self).__init__()
+        assert action_mode in ('tuple', 'discrete'), 'action_mode has to be tuple or discrete'
+        assert observation_mode in ('dict', 'array', 'flat'), 'observation_mode has to be dict, array or flat'
+        assert history_mode in ('full', 'none', 'ring', 'columnar'), 'history_mode has to be full, none, ring or columnar'
 
         self.player_colors = ['red', 'green', 'blue', 'yellow']
         self.is_notebook = 'ipykernel' in sys.modules
 
+        assert num_players <= MAX_PLAYERS, f'At most {MAX_PLAYERS} players are supported'
         self.num_players = num_players
         self.columns = np.arange(start=2, stop=13)
         self.column_lengths = {
@@ -81,91 +120,369 @@ class CantStopEnv(gym.Env):
             12: 3,
         }
 
-        self.action_space = CantStopActionSpace()  # 11 columns + 1 stop action
-
-        self.observation_space = spaces.Dict({
-            'player_markers': spaces.Dict({
-                p: spaces.Dict({
+        self.action_mode = action_mode
+        if action_mode == 'discrete':
+            self.action_space = spaces.Discrete(NUM_ACTIONS)
+        else:
+            self.action_space = CantStopActionSpace()
+        self.check_actions = check_actions
+        # Legal moves / action mask of the current state, computed on first use after each roll or marker change
+        self._legal_moves = None
+        self._action_mask = None
+        self._dice_buffer = []
+        self._dice_position = 0
+
+        self.observation_mode = observation_mode
+        if observation_mode == 'dict':
+            self.observation_space = spaces.Dict({
+                'player_markers': spaces.Dict({
+                    p: spaces.Dict({
+                        c: gym.spaces.Discrete(l) for c, l in self.column_lengths.items()
+                    }) for p in range(self.num_players)
+                }),
+                'tmp_markers': spaces.Dict({
                     c: gym.spaces.Discrete(l) for c, l in self.column_lengths.items()
-                }) for p in range(self.num_players)
-            }),
-            'tmp_markers': spaces.Dict({
-                c: gym.spaces.Discrete(l) for c, l in self.column_lengths.items()
-            }),
-            'current_player': spaces.Discrete(self.num_players),
-            'dice': spaces.Box(low=1, high=6, shape=(4,), dtype=int)
-        })
+                }),
+                'current_player': spaces.Discrete(self.num_players),
+                'dice': spaces.Box(low=1, high=6, shape=(4,), dtype=int)
+            })
+        else:
+            array_spaces = {
+                'player_markers': spaces.Box(low=-1, high=np.tile(COLUMN_TOPS, (self.num_players, 1)), dtype=np.int8),
+                'tmp_markers': spaces.Box(low=-1, high=COLUMN_TOPS, dtype=np.int8),
+                'current_player': spaces.Box(low=0, high=1, shape=(self.num_players,), dtype=np.int8),
+                'dice': spaces.Box(low=1, high=6, shape=(4,), dtype=np.int8)
+            }
+            if observation_mode == 'array':
+                self.observation_space = spaces.Dict(array_spaces)
+            else:
+                self.observation_space = spaces.Box(
+                    low=np.concatenate([space.low.ravel() for space in array_spaces.values()]),
+                    high=np.concatenate([space.high.ravel() for space in array_spaces.values()]),
+                    dtype=np.int8
+                )
+        self._allocate_observation()
+
+        self.history_mode = history_mode
+        self.history_capacity = history_capacity
+        self.action_history = None
+        self.stats = CantStopStats(self.num_players)
+
+        self.profile = profile
+        self._profile = None
+        if profile:
+            self._install_profile(CantStopProfile())
 
         self.reset()
 
-    def reset(self):
-        self.player_marker_positions = {p: {c.item(): None for c in self.columns} for p in range(self.num_players)}
-        self.tmp_marker_positions = {c.item(): None for c in self.columns}
-        self.current_player = int(np.random.randint(0, self.num_players, size=1))
-        self.dice = self._roll_dice()
-        self.winner = None
+    def _allocate_observation(self):
+        # Preallocated observation arrays: one flat buffer, of which the arrays of 'array' mode are views
+        if self.observation_mode == 'dict':
+            return
+
+        p = self.num_players
+        self._observation_buffer = np.zeros(shape=12 * p + 15, dtype=np.int8)
+        self._observation_arrays = {
+            'player_markers': self._observation_buffer[:11 * p].reshape(p, 11),
+            'tmp_markers': self._observation_buffer[11 * p:11 * p + 11],
+            'current_player': self._observation_buffer[11 * p + 11:12 * p + 11],
+            'dice': self._observation_buffer[12 * p + 11:]
+        }
+
+    def reset(self, seed=None, options=None):
+        # Seeds np_random (gymnasium), which is used for all dice rolls of the environment
+        super(CantStopEnv, self).reset(seed=seed)
+        if seed is not None:
+            # Discard dice drawn with the previous seed
+            self._dice_buffer = []
+            self._dice_position = 0
+
+        self.state = CantStopState(self.num_players)
+        self.current_player = int(self.np_random.integers(0, self.num_players))
+        self._roll_dice()
 
         # Variables to track game history
         self.observation_history = dict()
-        self.action_history = []
-        self.turn = 0
-        self.move = 0
+        if self.history_mode == 'full' or self.action_history is None:
+            self.action_history = self._create_action_history()
+        else:
+            self.action_history.clear()
+        self.stats.clear()
 
         # Return observation and auxiliary information dict
-        return self._get_observation(), {}
+        return self._get_observation(), self._get_info()
 
     def step(self, action):
+        if self.check_actions:
+            self._validate_action(action)
+        if self.action_mode == 'discrete':
+            action = decode_action(action)
+
+        reward, terminated = self._play_action(action)
+
+        observation = self._get_observation()
+        self._update_observation_history(observation)
+
+        return observation, reward, terminated, False, self._get_info()
+
+    def play_turn(self, policy):
+        # Play the rest of the current player's turn with policy, without building observations
+        # Returns whether the game has ended
+        # Policies declaring stop_after_rolls (see StopAfterNRollsPolicy) are run without calling select_action:
+        # they play a random legal move on every roll and stop once their roll counter reaches stop_after_rolls
+        assert self.state.winner is None, 'The game has already ended'
+
+        stop_after_rolls = getattr(policy, 'stop_after_rolls', None)
+        if stop_after_rolls is not None:
+            return self._play_stop_after_rolls_turn(policy, stop_after_rolls)
+
+        while True:
+            action = policy.select_action(self.get_possible_actions())
+            if self.check_actions:
+                self._validate_action(action)
+            if self.action_mode == 'discrete':
+                action = decode_action(action)
+
+            _, terminated = self._play_action(action)
+            self._record_turn_observation()
+
+            if terminated or not action[1]:
+                return terminated
+
+    def simulate_game(self, policies, seed=None):
+        # Play a game from the start, one policy per player, and return the winner
+        for policy in policies:
+            if hasattr(policy, 'reset'):
+                policy.reset()
+
+        self.reset(seed=seed)
+        while not self.play_turn(policies[self.state.current_player]):
+            pass
+
+        return self.state.winner
+
+    def simulate_games(self, policies, num_games, seed=None, stats=None):
+        # Play num_games games and return the number of wins of each player
+        # The environment is seeded for the first game and keeps drawing from its generator for the following ones
+        # The stats of every game are added to stats (a CantStopStats), if given
+        wins = np.zeros(shape=self.num_players, dtype=np.int64)
+        for game in range(num_games):
+            wins[self.simulate_game(policies, seed=seed if game == 0 else None)] += 1
+            if stats is not None:
+                stats += self.stats
+        return wins
+
+    def _play_stop_after_rolls_turn(self, policy, stop_after_rolls):
+        # Same choices (and draws from policy.random) as StopAfterNRollsPolicy.select_action, which picks
+        # from the possible actions: in discrete mode these are integer actions, which have no duplicate moves
+        # and are ordered by move index
+        choice = policy.random.choice
+        rolls = policy.current_rolls
+        if self.action_mode == 'discrete':
+            get_possible_moves = self._get_distinct_possible_moves
+        else:
+            get_possible_moves = self._get_possible_moves
 
-        assert self.action_space.contains(action), 'Action needs to be a tuple (columns, continue_flag)'
-        columns, continue_flag = action
+        while True:
+            columns = choice(get_possible_moves())
+            continue_flag = len(columns) > 0 and rolls < stop_after_rolls
+            rolls = rolls + 1 if continue_flag else 1
 
-        possible_moves = self._get_possible_moves()
-        assert columns in possible_moves, 'Impossible move'
+            _, terminated = self._play_action((columns, continue_flag))
+            self._record_turn_observation()
+
+            if terminated or not continue_flag:
+                policy.current_rolls = rolls
+                return terminated
+
+    def _validate_action(self, action):
+        if self.action_mode == 'discrete':
+            assert 0 <= action < NUM_ACTIONS and self._get_action_mask()[action], 'Impossible action'
+        else:
+            assert self.action_space.contains(action), 'Action needs to be a tuple (columns, continue_flag)'
+            columns, continue_flag = action
+            assert columns in self._get_possible_moves(), 'Impossible move'
+            assert len(columns) > 0 or continue_flag == False, 'Cannot continue after busting'
+
+    def _play_action(self, action):
+        # Apply a legal (columns, continue_flag) action and return reward and whether the game has ended
+        columns, continue_flag = action
+        state = self.state
 
         self._update_action_history(action)
-        self.move += 1
+        self.stats.record_action(state.current_player, state.move, len(columns) == 0)
+        state.move += 1
 
         if len(columns) == 0: # Bust
-            assert continue_flag == False, 'Cannot continue after busting'
             reward = -1 #TODO: Set correct reward value
 
             # Reset tmp markers
-            self.tmp_marker_positions = {c.item(): None for c in self.columns}
+            self._clear_tmp_markers()
 
             # Set next player and roll dice
             self._switch_to_next_player()
-            self.dice = self._roll_dice()
+            self._roll_dice()
+            return reward, False
+
+        reward = self._move_markers(action)
+
+        if continue_flag: # continue
+            self._roll_dice()
+            return reward, False
+
+        # stop
+        # Update player marker positions and reset tmp markers
+        reward = self._end_turn()
+        terminated = self._check_game_end()
+
+        if terminated:
+            self.stats.record_game_end(self.state.winner)
+        else:
+            # Set next player and roll dice
+            self._switch_to_next_player()
+            self._roll_dice()
+
+        return reward, terminated
+
+    def get_state(self, include_rng=False):
+        # Snapshot of the game state only (no observation space, no history)
+        # Including the RNG state makes restored games roll the same dice again
+        state = self.state.copy()
+        if include_rng:
+            # The dice buffer is replaced when refilled, never modified, so it can be shared
+            state.rng_state = (self.np_random.bit_generator.state, self._dice_buffer, self._dice_position)
+        return state
+
+    def set_state(self, state):
+        # Restore a snapshot taken with get_state; the RNG is only restored if the snapshot includes it
+        self.state = state.copy()
+        self._legal_moves = None
+        self._action_mask = None
+        if state.rng_state is not None:
+            self.np_random.bit_generator.state, self._dice_buffer, self._dice_position = state.rng_state
+            self.state.rng_state = None
+
+    def clone(self, history_mode=None):
+        # Copy of the environment sharing its (read-only) configuration and spaces, with a fresh history
+        # (e.g. history_mode='none' for simulations)
+        # The clone rolls its own dice, from a generator spawned from the one of this environment
+        env = CantStopEnv.__new__(CantStopEnv)
+        env.__dict__.update(self.__dict__)
+        env.state = self.state.copy()
+        env._np_random = np.random.Generator(type(self.np_random.bit_generator)(
+            self.np_random.bit_generator.seed_seq.spawn(1)[0]
+        ))
+        env._dice_buffer = []
+        env._dice_position = 0
+        env.history_mode = history_mode or self.history_mode
+        env.observation_history = dict()
+        env.action_history = env._create_action_history()
+        env.stats = CantStopStats(self.num_players)
+        env._allocate_observation()
+        # The timed methods of this environment are bound to it, the clone gets its own
+        for name in PROFILED_METHODS:
+            env.__dict__.pop(name, None)
+        if self.profile:
+            env._install_profile(CantStopProfile())
+        return env
+
+    def get_profile(self):
+        # Calls and time per phase since the environment was created (not reset between games)
+        assert self.profile, 'Profiling is disabled, create the environment with profile=True'
+        return self._profile
+
+    def _install_profile(self, profile):
+        # Replace the methods of every phase by timed versions, as instance attributes
+        self._profile = profile
+        for phase, methods in PROFILE_PHASES.items():
+            for name in methods:
+                self.__dict__.pop(name, None)
+                setattr(self, name, profile.wrap(phase, getattr(self, name)))
+
+    def __getstate__(self):
+        # Timed methods are closures, which can't be pickled; they are installed again when unpickling
+        state = self.__dict__.copy()
+        for name in PROFILED_METHODS:
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.profile:
+            self._install_profile(self._profile)
+
+    def _create_action_history(self):
+        if self.history_mode == 'full':
+            return []
+        elif self.history_mode == 'columnar':
+            return ColumnarHistory(self.history_capacity)
+        elif self.history_mode == 'ring':
+            return RingHistory(self.history_capacity)
+        return NullHistory()
+
+    # Read-only views of the game state, kept for observations, rendering and stats
+    @property
+    def player_marker_positions(self):
+        return {
+            p: {c: (None if pos < 0 else pos) for c, pos in zip(self.column_lengths, markers.tolist())}
+            for p, markers in enumerate(self.state.player_markers)
+        }
 
-            terminated = False
-            observation = self._get_observation()
-            self._update_observation_history(observation)
+    @property
+    def tmp_marker_positions(self):
+        return {c: (None if pos < 0 else pos) for c, pos in zip(self.column_lengths, self.state.tmp_markers.tolist())}
 
-        else: # Move
-            reward = self._move_markers(action)
+    @property
+    def current_player(self):
+        return self.state.current_player
 
-            if continue_flag: # continue
-                self.dice = self._roll_dice()
-                terminated = False
-                observation = self._get_observation()
-                self._update_observation_history(observation)
+    @current_player.setter
+    def current_player(self, value):
+        state = self.state
+        state.hash ^= ZOBRIST_CURRENT_PLAYER[state.current_player] ^ ZOBRIST_CURRENT_PLAYER[value]
+        state.current_player = value
 
-            else: # stop
-                # Update player marker positions and reset tmp markers
-                reward = self._end_turn()
-                terminated = self._check_game_end()
+    @property
+    def dice(self):
+        return self.state.dice
 
-                if not terminated:
-                    # Set next player and roll dice
-                    self._switch_to_next_player()
-                    self.dice = self._roll_dice()
+    @dice.setter
+    def dice(self, value):
+        roll = int(ROLL_INDEX[roll_code(value)])
+        self.state.roll = roll
+        self.state.dice = ROLLS[roll]
+        self._legal_moves = None
+        self._action_mask = None
 
-                observation = self._get_observation()
-                self._update_observation_history(observation)
+    @property
+    def winner(self):
+        return self.state.winner
 
-        return observation, reward, terminated, False, {}
+    @winner.setter
+    def winner(self, value):
+        self.state.winner = value
+        self._action_mask = None
+
+    @property
+    def turn(self):
+        return self.state.turn
+
+    @turn.setter
+    def turn(self, value):
+        self.state.turn = value
+
+    @property
+    def move(self):
+        return self.state.move
+
+    @move.setter
+    def move(self, value):
+        self.state.move = value
 
 
     def render(self):
+        import colorama
+        from colorama import Fore, Style
 
         colorama.init(autoreset=True)
 
@@ -235,6 +552,7 @@ class CantStopEnv(gym.Env):
             html += f"Dice roll: {self.dice}<br>"
             html += '</pre>'
 
+            from IPython.display import display, HTML
             display(HTML(html))
 
         else: # Print coloured output using colorama
@@ -294,6 +612,8 @@ class CantStopEnv(gym.Env):
                 f"Current player: {color_map[self.player_colors[self.current_player]]}Player {self.current_player}{Style.RESET_ALL}")
             print(f"Dice roll: {self.dice}, \n")
 
+            import pandas as pd
+
             action_stats = self.get_action_stats()
             with pd.option_context('display.max_columns', None):
                 print(action_stats)
@@ -301,6 +621,9 @@ class CantStopEnv(gym.Env):
 
 
     def get_possible_actions(self):
+        if self.action_mode == 'discrete':
+            return np.flatnonzero(self._get_action_mask()).tolist()
+
         possible_actions = []
         possible_moves = self._get_possible_moves()
 
@@ -316,173 +639,206 @@ class CantStopEnv(gym.Env):
         return possible_actions
 
     def _roll_dice(self):
-        # Roll 4 dice
-        return np.sort(np.random.randint(1, 7, size=4))
+        # Roll 4 dice and store the sorted roll
+        if self._dice_position == len(self._dice_buffer):
+            # Draw a new block of rolls, each one of the 1296 ordered rolls, stored as sorted roll index
+            rolls = self.np_random.integers(0, len(ROLL_INDEX), size=DICE_BLOCK_SIZE)
+            self._dice_buffer = ROLL_INDEX[rolls].tolist()
+            self._dice_position = 0
+
+        roll = self._dice_buffer[self._dice_position]
+        self._dice_position += 1
+        self.state.roll = roll
+        self.state.dice = ROLLS[roll]
+        self._legal_moves = None
+        self._action_mask = None
 
     def _get_observation(self):
-        return {
-            'player_markers': self.player_marker_positions,
-            'temp_markers': self.tmp_marker_positions,
-            'current_player': self.current_player,
-            'dice': self.dice
-        }
+        if self.observation_mode == 'dict':
+            return {
+                'player_markers': self.player_marker_positions,
+                'tmp_markers': self.tmp_marker_positions,
+                'current_player': self.current_player,
+                'dice': self.dice
+            }
 
-    def _get_dice_combinations(self):
-        dice = self.dice
-        # Return all possible combination of summing up 4 dice into pairs
-        combinations = {
-            tuple(sorted([dice[0] + dice[1], dice[2] + dice[3]])),
-            tuple(sorted([dice[0] + dice[2], dice[1] + dice[3]])),
-            tuple(sorted([dice[0] + dice[3], dice[1] + dice[2]]))
-        }
-        return combinations
+        # Write the state into the preallocated observation arrays
+        state = self.state
+        arrays = self._observation_arrays
+        arrays['player_markers'][:] = state.player_markers
+        arrays['tmp_markers'][:] = state.tmp_markers
+        arrays['current_player'].fill(0)
+        arrays['current_player'][state.current_player] = 1
+        arrays['dice'][:] = state.dice
 
-    def _get_available_columns(self):
-        # Set all columns to available
-        available_columns = self.columns.copy()
+        if self.observation_mode == 'array':
+            return arrays
+        return self._observation_buffer
 
-        for column in self.columns:
-            for player in range(self.num_players):
-                # If a player marker has reached the final slot on a column, remove this one from the available ones
-                if self.player_marker_positions[player][column] == self.column_lengths[column] - 1:
-                    available_columns = np.delete(available_columns, np.where(available_columns == column))
-                    break
+    def _get_available_columns(self):
+        # Bitmask of available columns
+        # A column is unavailable if any player marker or the tmp marker has reached its final slot
+        return ALL_COLUMNS & ~(self.state.completed_columns | self.state.tmp_completed_columns)
 
-            # If the column has a tmp marker on the final slot, also remove from available ones
-            if self.tmp_marker_positions[column] == self.column_lengths[column] - 1:
-                available_columns = np.delete(available_columns, np.where(available_columns == column))
+    def _get_move_key(self):
+        # Everything the legal moves depend on: roll, available columns, tmp columns and free tmp markers
+        # Columns the roll can't move on are left out, so equivalent boards share cached legal moves
+        state = self.state
+        available_columns = self._get_available_columns() & ROLL_COLUMNS[state.roll]
+        tmp_columns = state.tmp_columns & available_columns
+        free_temp_markers = 3 - bin(state.tmp_columns).count('1')
 
-        return set(available_columns)
+        return state.roll, available_columns, tmp_columns, free_temp_markers
 
     def _get_possible_moves(self):
-        dice_combinations = self._get_dice_combinations()
-        available_columns = self._get_available_columns()
-
-        tmp_columns = set([column for column, level in self.tmp_marker_positions.items() if
-                           level is not None and level != self.column_lengths[column] - 1])
-        complete_tmp_columns = set(
-            [column for column, level in self.tmp_marker_positions.items() if level == self.column_lengths[column] - 1])
-        free_temp_markers = 3 - len(tmp_columns) - len(complete_tmp_columns)
-
-        possible_moves = []
-        for pair in dice_combinations:
-            pair_available = tuple(p for p in pair if p in available_columns)
-
-            # If none of the columns of the pair are available, no move can be made using this pair
-            if len(pair_available) == 0:
-                continue
-
-            # If no more temp markers are available, only columns that are in tmp_columns can be moved on
-            elif free_temp_markers == 0:
-                if len(set(pair_available) & tmp_columns) > 0:
-                    possible_moves.append(tuple(p for p in pair_available if p in tmp_columns))
-
-            # If enough free tmp markers for each pair (not already in tmp columns) are available, complete pair is possible
-            elif len(set(pair_available) - tmp_columns) <= free_temp_markers:
-                possible_moves.append(pair_available)
-
-            # If only 1 free tmp marker but two columns, then add each individually
+        # Look up the possible moves for the current roll (cached until the next roll or marker change)
+        if self._legal_moves is None:
+            self._legal_moves = get_legal_moves(*self._get_move_key())
+        return self._legal_moves
+
+    def _get_distinct_possible_moves(self):
+        # Possible moves without duplicates, in the order of the legal integer actions
+        return get_distinct_legal_moves(*self._get_move_key())
+
+    def _get_action_mask(self):
+        if self._action_mask is None:
+            if self.state.winner is not None:
+                self._action_mask = NO_ACTIONS
             else:
-                possible_moves += [tuple([p]) for p in pair_available]
-
-        # Add empty tuple (representing bust) if no moves are possible
-        if len(possible_moves) == 0:
-            possible_moves.append(tuple())
+                self._action_mask = get_legal_action_mask(*self._get_move_key())
+        return self._action_mask
 
-        return possible_moves
+    def _get_info(self):
+        if self.action_mode == 'discrete':
+            return {'action_mask': self._get_action_mask()}
+        return {}
 
     def _move_markers(self, action):
         columns, _ = action
+        state = self.state
+        tmp_markers = state.tmp_markers
         for column in columns:
-            if self.tmp_marker_positions[column] is None:
-                self.tmp_marker_positions[column] = 0
-            else:
-                self.tmp_marker_positions[column] += 1
+            # A column without tmp marker (-1) starts at 0, markers can't move past the final slot
+            i = column - 2
+            old_position = tmp_markers.item(i)
+            position = old_position + 1
+            state.tmp_columns |= 1 << i
+            if position >= COLUMN_TOPS.item(i):
+                position = COLUMN_TOPS.item(i)
+                state.tmp_completed_columns |= 1 << i
+            tmp_markers[i] = position
+            state.hash ^= ZOBRIST_TMP_MARKERS[i][old_position + 1] ^ ZOBRIST_TMP_MARKERS[i][position + 1]
 
         reward = 0 #TODO: Set correct reward value
         return reward
 
     def _switch_to_next_player(self):
-        self.current_player = (self.current_player + 1) % self.num_players
-        self.turn += 1
-        self.move = 0
+        state = self.state
+        next_player = (state.current_player + 1) % self.num_players
+        state.hash ^= ZOBRIST_CURRENT_PLAYER[state.current_player] ^ ZOBRIST_CURRENT_PLAYER[next_player]
+        state.current_player = next_player
+        state.turn += 1
+        state.move = 0
 
     def _update_action_history(self, action):
         columns, continue_flag = action
-        action_record = [self.turn, self.move, self.current_player, columns, continue_flag]
-        self.action_history.append(action_record)
+        state = self.state
+        if self.history_mode == 'full':
+            action_record = [state.turn, state.move, state.current_player, columns, continue_flag]
+            self.action_history.append(action_record)
+        else:
+            self.action_history.record(state.turn, state.move, state.current_player, columns, continue_flag)
 
     def _update_observation_history(self, observation):
+        # Observations are only recorded in full history mode
+        if self.history_mode != 'full':
+            return
+
         key = len(self.observation_history)
-        self.observation_history[key] = observation
+        if self.observation_mode == 'dict':
+            self.observation_history[key] = observation
+        else:
+            # Preallocated observation arrays are overwritten on every step
+            self.observation_history[key] = self._observation_buffer.copy()
+
+    def _record_turn_observation(self):
+        # Observations are only built inside play_turn if they are recorded
+        if self.history_mode == 'full':
+            self._update_observation_history(self._get_observation())
 
     def _end_turn(self):
         # Set positions of tmp markers to marker positions of current player
-        for column, position in self.tmp_marker_positions.items():
-            if position is not None:
-                self.player_marker_positions[self.current_player][column] = position
+        state = self.state
+        tmp_markers = state.tmp_markers
+        player_markers = state.player_markers[state.current_player]
+        self._record_column_stats(player_markers, tmp_markers)
+        # Only columns with tmp markers change, so only their keys are swapped in the hash
+        player_keys = ZOBRIST_PLAYER_MARKERS[state.current_player]
+        for i in self._get_tmp_column_indices():
+            player_keys_i = player_keys[i]
+            state.hash ^= player_keys_i[player_markers.item(i) + 1] ^ player_keys_i[tmp_markers.item(i) + 1]
+        np.copyto(player_markers, tmp_markers, where=tmp_markers >= 0)
+        # Columns the tmp markers completed are now completed for good
+        state.completed_columns |= state.tmp_completed_columns
         # Reset tmp markers
-        self.tmp_marker_positions = {c.item(): None for c in self.columns}
+        self._clear_tmp_markers()
 
         reward = 0 #TODO: Set correct reward value
         return reward
 
+    def _clear_tmp_markers(self):
+        state = self.state
+        tmp_markers = state.tmp_markers
+        for i in self._get_tmp_column_indices():
+            state.hash ^= ZOBRIST_TMP_MARKERS[i][tmp_markers.item(i) + 1]
+        tmp_markers.fill(-1)
+        state.tmp_columns = 0
+        state.tmp_completed_columns = 0
+        self._legal_moves = None
+        self._action_mask = None
+
+    def _get_tmp_column_indices(self):
+        # Indices of the columns with tmp markers, from the bits of tmp_columns
+        tmp_columns = self.state.tmp_columns
+        indices = []
+        while tmp_columns:
+            low_bit = tmp_columns & -tmp_columns
+            indices.append(low_bit.bit_length() - 1)
+            tmp_columns ^= low_bit
+        return indices
+
     def _check_game_end(self):
         # Check if any player has 3 columns complete (i.e., marker positioned at highest position)
-        for player, positions in self.player_marker_positions.items():
-            complete_columns = sum([positions[column] == self.column_lengths[column] - 1 for column in self.column_lengths])
-            if complete_columns >= 3:
-                self.winner = player
-                return True
+        complete_columns = np.count_nonzero(self.state.player_markers == COLUMN_TOPS, axis=1)
+        winners = np.flatnonzero(complete_columns >= 3)
+        if len(winners) > 0:
+            self.state.winner = int(winners[0])
+            return True
         return False
 
     def get_action_history(self):
+        import pandas as pd
+
         columns = ['turn', 'move', 'player', 'columns', 'continue_flag']
-        action_history_df = pd.DataFrame(self.action_history, columns=columns)
-        return action_history_df
+        if self.history_mode == 'full':
+            return pd.DataFrame(self.action_history, columns=columns)
 
-    def get_action_stats(self):
-        action_history_df = self.get_action_history()
-
-        roll_stats_df = action_history_df.groupby('player').agg(
-            dice_rolls=('player', 'size'),
-            turns=('turn', 'nunique'),
-            busts=('columns', lambda x: (x == ()).sum())
-        ).assign(
-            rolls_per_turn=lambda x: x['dice_rolls'] / x['turns']
-        ).reset_index()
-
-        column_stats = []
-        for player, columns in self.player_marker_positions.items():
-            started = sum([
-                self.column_lengths[column] - 1 > columns[column] > 0
-                if columns[column] is not None else 0
-                for column in self.column_lengths
-            ])
-            complete = sum([
-                columns[column] == self.column_lengths[column] - 1
-                if columns[column] is not None else 0
-                for column in self.column_lengths
-            ])
-            column_stats.append((player, started, complete))
-
-        column_stats_df = pd.DataFrame.from_records(
-            column_stats,
-            columns=['player', 'columns_started', 'columns_completed']
-        )
-
-        action_stats_df = pd.merge(
-            left=roll_stats_df, right=column_stats_df, how='inner', on='player'
-        ).rename(
-            columns={
-                'player': 'Player',
-                'dice_rolls': 'Rolls',
-                'turns': 'Turns',
-                'busts': 'Busts',
-                'rolls_per_turn': 'Rolls / turn',
-                'columns_started': 'Cols started',
-                'columns_completed': 'Cols completed'
-            }
-        )
+        history = self.action_history.get_columns()
+        action_history_df = pd.DataFrame(history)
+        action_history_df['columns'] = [
+            tuple(c for c in (col_a, col_b) if c > 0)
+            for col_a, col_b in zip(history['col_a'].tolist(), history['col_b'].tolist())
+        ]
+        return action_history_df[columns + ['col_a', 'col_b']]
 
-        return action_stats_df
\ No newline at end of file
+    def get_action_stats(self):
+        return self.stats.to_dataframe()
+
+    def _record_column_stats(self, player_markers, tmp_markers):
+        # Only the (at most 3) columns with tmp markers change
+        moved = tmp_markers >= 0
+        tops = COLUMN_TOPS[moved]
+        old, new = player_markers[moved], tmp_markers[moved]
+        started = int(np.count_nonzero((new > 0) & (new < tops))) - int(np.count_nonzero((old > 0) & (old < tops)))
+        completed = int(np.count_nonzero(new == tops)) - int(np.count_nonzero(old == tops))
+        self.stats.record_columns(self.state.current_player, started, completed)
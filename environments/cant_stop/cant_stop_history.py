@@ -0,0 +1,93 @@
+import numpy as np
+
+
+# Action history stored as columns of NumPy arrays:
+# turn, move, player, col_a, col_b (0 = no column), continue_flag
+HISTORY_COLUMNS = {
+    'turn': np.int32,
+    'move': np.int16,
+    'player': np.int8,
+    'col_a': np.int8,
+    'col_b': np.int8,
+    'continue_flag': bool,
+}
+
+
+class ColumnarHistory:
+    # Append-only history; the arrays grow geometrically when full
+    def __init__(self, capacity=1024):
+        self.capacity = capacity
+        self.size = 0
+        self.arrays = {name: np.zeros(shape=capacity, dtype=dtype) for name, dtype in HISTORY_COLUMNS.items()}
+
+    def __len__(self):
+        return self.size
+
+    def record(self, turn, move, player, columns, continue_flag):
+        if self.size == self.capacity:
+            self._grow()
+        self._write(self.size, turn, move, player, columns, continue_flag)
+        self.size += 1
+
+    def clear(self):
+        self.size = 0
+
+    def get_columns(self):
+        # Recorded actions in chronological order, as a dict of arrays
+        return {name: array[:self.size] for name, array in self.arrays.items()}
+
+    def _grow(self):
+        self.capacity *= 2
+        for name, array in self.arrays.items():
+            grown = np.zeros(shape=self.capacity, dtype=array.dtype)
+            grown[:len(array)] = array
+            self.arrays[name] = grown
+
+    def _write(self, i, turn, move, player, columns, continue_flag):
+        arrays = self.arrays
+        arrays['turn'][i] = turn
+        arrays['move'][i] = move
+        arrays['player'][i] = player
+        arrays['col_a'][i] = columns[0] if len(columns) > 0 else 0
+        arrays['col_b'][i] = columns[1] if len(columns) > 1 else 0
+        arrays['continue_flag'][i] = continue_flag
+
+
+class RingHistory(ColumnarHistory):
+    # Fixed-capacity history keeping only the most recent actions
+    def __init__(self, capacity=1024):
+        super(RingHistory, self).__init__(capacity)
+        self.start = 0
+
+    def record(self, turn, move, player, columns, continue_flag):
+        if self.size < self.capacity:
+            self._write(self.size, turn, move, player, columns, continue_flag)
+            self.size += 1
+        else:
+            # Overwrite the oldest action
+            self._write(self.start, turn, move, player, columns, continue_flag)
+            self.start = (self.start + 1) % self.capacity
+
+    def clear(self):
+        self.size = 0
+        self.start = 0
+
+    def get_columns(self):
+        if self.start == 0:
+            return super(RingHistory, self).get_columns()
+        return {name: np.roll(array, -self.start) for name, array in self.arrays.items()}
+
+
+class NullHistory:
+    # History that records nothing
+    def __len__(self):
+        return 0
+
+    def record(self, turn, move, player, columns, continue_flag):
+        pass
+
+    def clear(self):
+        pass
+
+    def get_columns(self):
+        return {name: np.zeros(shape=0, dtype=dtype) for name, dtype in HISTORY_COLUMNS.items()}
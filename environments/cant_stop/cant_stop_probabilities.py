@@ -0,0 +1,112 @@
+import os
+import tempfile
+
+import numpy as np
+
+from .cant_stop_env import ENV_VERSION
+from .cant_stop_tables import ALL_COLUMNS, ROLL_PAIR_SUMS, ROLL_PROBABILITIES
+
+
+# Exact bust probability and expected progress of the next roll for every tmp marker configuration
+# A configuration consists of:
+#   tmp mask: columns with a tmp marker (at most 3), indexed through TMP_CONFIG_INDEX
+#   blocked mask: columns that can't be moved on anymore (completed by any player or tmp marker on the final slot)
+# Expected progress is the expected number of steps of the move advancing the most (0 when busting)
+
+# The file name contains the rules version, so tables cached by a checkout with different rules are not reused
+TABLES_PATH = os.path.join(os.path.dirname(__file__), f'cant_stop_probabilities.v{ENV_VERSION}.npy')
+
+# All tmp masks with at most 3 columns, and the index of each one in the tables (-1 = invalid mask)
+TMP_CONFIGS = np.array([m for m in range(1 << 11) if bin(m).count('1') <= 3], dtype=np.int64)
+TMP_CONFIG_INDEX = np.full(shape=1 << 11, fill_value=-1, dtype=np.int64)
+TMP_CONFIG_INDEX[TMP_CONFIGS] = np.arange(len(TMP_CONFIGS))
+
+BUST_PROBABILITY = 0
+EXPECTED_PROGRESS = 1
+
+_tables = None
+
+
+def compute_tables():
+    # Weighs each roll with the number of the 1296 ordered rolls it stands for and applies the rules of CantStopEnv
+    blocked = np.arange(1 << 11)[:, None, None]
+    a = ROLL_PAIR_SUMS[None, :, :, 0] - 2
+    b = ROLL_PAIR_SUMS[None, :, :, 1] - 2
+    same_column = a == b
+
+    tables = np.zeros(shape=(2, len(TMP_CONFIGS), 1 << 11), dtype=np.float32)
+    for i, tmp_mask in enumerate(TMP_CONFIGS.tolist()):
+        free_tmp_markers = 3 - bin(tmp_mask).count('1')
+        open_mask = ~blocked & ALL_COLUMNS
+        tmp_open = open_mask & tmp_mask
+
+        a_available, b_available = (open_mask >> a) & 1 == 1, (open_mask >> b) & 1 == 1
+        a_tmp, b_tmp = (tmp_open >> a) & 1 == 1, (tmp_open >> b) & 1 == 1
+
+        if free_tmp_markers == 0:
+            # Only columns that are in tmp columns can be moved on
+            steps = (a_available & a_tmp).astype(np.int64) + (b_available & b_tmp)
+        else:
+            # Both columns can be moved on unless this would take more tmp markers than are left
+            a_new = a_available & ~a_tmp
+            b_new = b_available & ~b_tmp & ~(same_column & a_new)
+            split = a_new.astype(np.int64) + b_new > free_tmp_markers
+            steps = np.where(split, 1, a_available.astype(np.int64) + b_available)
+
+        best_steps = steps.max(axis=2)
+        tables[BUST_PROBABILITY, i] = (best_steps == 0) @ ROLL_PROBABILITIES
+        tables[EXPECTED_PROGRESS, i] = best_steps @ ROLL_PROBABILITIES
+
+    return tables
+
+
+def load_tables(path=TABLES_PATH):
+    # Memory-map the tables from disk, computing and caching them on first use
+    # The file is written under a temporary name and then renamed, so other processes never map a partly
+    # written file; if it can't be written (e.g. read-only installation), the tables are kept in memory
+    global _tables
+    if _tables is None:
+        expected_shape = (2, len(TMP_CONFIGS), 1 << 11)
+        if os.path.exists(path):
+            tables = np.load(path, mmap_mode='r')
+            if tables.shape != expected_shape or tables.dtype != np.float32:
+                tables = None
+        else:
+            tables = None
+
+        if tables is None:
+            tables = compute_tables()
+            try:
+                fd, tmp_path = tempfile.mkstemp(suffix='.npy', dir=os.path.dirname(path))
+            except OSError:
+                tmp_path = None
+            if tmp_path is not None:
+                try:
+                    with os.fdopen(fd, 'wb') as f:
+                        np.save(f, tables)
+                    os.replace(tmp_path, path)
+                    tables = np.load(path, mmap_mode='r')
+                except OSError:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+
+        _tables = tables
+
+    return _tables
+
+
+def get_column_masks(state):
+    # Tmp mask and blocked mask of a CantStopState
+    return state.tmp_columns, state.completed_columns | state.tmp_completed_columns
+
+
+def get_bust_probability(tmp_mask, blocked_mask):
+    config = TMP_CONFIG_INDEX[tmp_mask]
+    assert config >= 0, 'At most 3 columns can have tmp markers'
+    return float(load_tables()[BUST_PROBABILITY, config, blocked_mask])
+
+
+def get_expected_progress(tmp_mask, blocked_mask):
+    config = TMP_CONFIG_INDEX[tmp_mask]
+    assert config >= 0, 'At most 3 columns can have tmp markers'
+    return float(load_tables()[EXPECTED_PROGRESS, config, blocked_mask])
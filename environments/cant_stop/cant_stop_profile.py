@@ -0,0 +1,84 @@
+import time
+
+
+# Methods of CantStopEnv timed for each phase of a step
+# Times are exclusive: time spent in a nested timed method only counts for the nested method's phase,
+# so 'other' is the rest of step / play_turn (including the select_action calls of play_turn)
+PROFILE_PHASES = {
+    'validation': ['_validate_action'],
+    'move_generation': ['_get_possible_moves', '_get_distinct_possible_moves', '_get_action_mask'],
+    'dice': ['_roll_dice'],
+    'markers': ['_move_markers', '_end_turn', '_clear_tmp_markers', '_switch_to_next_player'],
+    'game_end': ['_check_game_end'],
+    'history': ['_update_action_history', '_update_observation_history', '_record_turn_observation',
+                '_record_column_stats'],
+    'observation': ['_get_observation', '_get_info'],
+    'other': ['step', 'play_turn'],
+}
+
+PROFILED_METHODS = [method for methods in PROFILE_PHASES.values() for method in methods]
+
+
+class CantStopProfile:
+    # Number of calls and time (seconds) per phase of CantStopEnv(profile=True), over all games since it was created
+    # Profiles of several environments (e.g. from different worker processes) are merged with + / +=
+    def __init__(self):
+        self.calls = dict.fromkeys(PROFILE_PHASES, 0)
+        self.times = dict.fromkeys(PROFILE_PHASES, 0.0)
+        self._nested_times = [] # Time of nested timed calls, for each timed call in progress
+
+    def clear(self):
+        for phase in PROFILE_PHASES:
+            self.calls[phase] = 0
+            self.times[phase] = 0.0
+
+    def wrap(self, phase, method):
+        # Timed version of a (bound) method
+        calls, times, nested_times = self.calls, self.times, self._nested_times
+
+        def timed_method(*args, **kwargs):
+            nested_times.append(0.0)
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                times[phase] += elapsed - nested_times.pop()
+                calls[phase] += 1
+                if nested_times:
+                    nested_times[-1] += elapsed
+
+        return timed_method
+
+    def __iadd__(self, other):
+        for phase in PROFILE_PHASES:
+            self.calls[phase] += other.calls[phase]
+            self.times[phase] += other.times[phase]
+        return self
+
+    def __add__(self, other):
+        profile = CantStopProfile()
+        profile += self
+        profile += other
+        return profile
+
+    def __getstate__(self):
+        return {'calls': self.calls, 'times': self.times}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._nested_times = []
+
+    def to_dataframe(self):
+        import pandas as pd
+
+        total_time = sum(self.times.values())
+        return pd.DataFrame({
+            'Phase': list(PROFILE_PHASES),
+            'Calls': [self.calls[phase] for phase in PROFILE_PHASES],
+            'Time (s)': [self.times[phase] for phase in PROFILE_PHASES],
+            'Time / call (us)': [
+                1e6 * self.times[phase] / self.calls[phase] if self.calls[phase] else 0.0 for phase in PROFILE_PHASES
+            ],
+            'Share': [self.times[phase] / total_time if total_time else 0.0 for phase in PROFILE_PHASES],
+        })
@@ -0,0 +1,185 @@
+import os
+import struct
+
+import numpy as np
+
+from .cant_stop_env import CantStopEnv
+from .cant_stop_state import get_state_hash
+from .cant_stop_tables import ROLLS, decode_action, encode_action
+
+
+# Binary replay log of Can't Stop games
+#
+# Log file:   header (magic, version), followed by the games
+#   game:     header (seed, number of players, starting player, initial roll, number of moves),
+#             followed by one 2-byte record per move: (integer action, roll after the move)
+# Index file: header (magic, version), followed by the offset of every game in the log file (<log path>.idx)
+#
+# Rolls are indices into cant_stop_tables.ROLLS, NO_ROLL marks the final move of a game.
+# Storing the rolls makes replays independent of the RNG that produced the game.
+
+LOG_MAGIC = b'CSRL'
+INDEX_MAGIC = b'CSRI'
+VERSION = 1
+
+FILE_HEADER = struct.Struct('<4sHH')
+GAME_HEADER = struct.Struct('<QBBBI')
+MOVE_RECORD_SIZE = 2
+
+NO_SEED = 2 ** 64 - 1
+NO_ROLL = 255
+
+
+class ReplayGame:
+    # One game read from a replay log; actions and rolls are views into the memory-mapped file
+    __slots__ = ('seed', 'num_players', 'starting_player', 'initial_roll', 'actions', 'rolls')
+
+    def __init__(self, seed, num_players, starting_player, initial_roll, actions, rolls):
+        self.seed = None if seed == NO_SEED else seed
+        self.num_players = num_players
+        self.starting_player = starting_player
+        self.initial_roll = initial_roll
+        self.actions = actions
+        self.rolls = rolls
+
+    def __len__(self):
+        return len(self.actions)
+
+
+class ReplayWriter:
+    # Appends games to a replay log, e.g.:
+    #   writer.start_game(env, seed)  # after env.reset(seed=seed)
+    #   writer.record(env, action)    # after every env.step(action)
+    #   writer.end_game()
+    def __init__(self, path):
+        self.path = path
+        self.index_path = path + '.idx'
+        self.log_file = _open_append(path, LOG_MAGIC)
+        self.index_file = _open_append(self.index_path, INDEX_MAGIC)
+        self._game = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.log_file.close()
+        self.index_file.close()
+
+    def start_game(self, env, seed=None):
+        state = env.state
+        self._game = (seed, env.num_players, state.current_player, state.roll, bytearray())
+
+    def record(self, env, action):
+        if not isinstance(action, (int, np.integer)):
+            action = encode_action(*action)
+        roll = NO_ROLL if env.state.winner is not None else env.state.roll
+        self._game[-1].extend((action, roll))
+
+    def end_game(self):
+        seed, num_players, starting_player, initial_roll, moves = self._game
+        actions = np.frombuffer(bytes(moves), dtype=np.uint8)
+        self.write_game(seed, num_players, starting_player, initial_roll, actions[0::2], actions[1::2])
+        self._game = None
+
+    def write_game(self, seed, num_players, starting_player, initial_roll, actions, rolls):
+        moves = np.empty(shape=(len(actions), MOVE_RECORD_SIZE), dtype=np.uint8)
+        moves[:, 0] = actions
+        moves[:, 1] = rolls
+
+        offset = self.log_file.tell()
+        self.log_file.write(GAME_HEADER.pack(
+            NO_SEED if seed is None else seed, num_players, starting_player, initial_roll, len(actions)
+        ))
+        self.log_file.write(moves.tobytes())
+        self.log_file.flush()
+
+        self.index_file.write(struct.pack('<Q', offset))
+        self.index_file.flush()
+
+
+class ReplayReader:
+    # Reads a replay log through a memory map; games are parsed lazily
+    def __init__(self, path):
+        self.path = path
+        self.data = np.memmap(path, dtype=np.uint8, mode='r')
+        _check_header(self.data, LOG_MAGIC, path)
+
+        index_path = path + '.idx'
+        if os.path.exists(index_path):
+            index = np.memmap(index_path, dtype=np.uint8, mode='r')
+            _check_header(index, INDEX_MAGIC, index_path)
+            self.offsets = index[FILE_HEADER.size:].view(np.uint64)
+        else:
+            self.offsets = self._scan_offsets()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __iter__(self):
+        for k in range(len(self)):
+            yield self[k]
+
+    def __getitem__(self, k):
+        offset = int(self.offsets[k])
+        seed, num_players, starting_player, initial_roll, num_moves = GAME_HEADER.unpack_from(self.data, offset)
+        start = offset + GAME_HEADER.size
+        moves = self.data[start:start + num_moves * MOVE_RECORD_SIZE].reshape(num_moves, MOVE_RECORD_SIZE)
+        return ReplayGame(seed, num_players, starting_player, initial_roll, moves[:, 0], moves[:, 1])
+
+    def replay(self, k, num_moves=None, env=None):
+        # Environment in the state of game k after num_moves moves (default: the end of the game)
+        game = self[k]
+        if env is None:
+            env = CantStopEnv(num_players=game.num_players, history_mode='none')
+
+        env.reset(seed=game.seed)
+        _set_state(env, current_player=game.starting_player, roll=game.initial_roll)
+
+        num_moves = len(game) if num_moves is None else num_moves
+        for action, roll in zip(game.actions[:num_moves].tolist(), game.rolls[:num_moves].tolist()):
+            env.step(action if env.action_mode == 'discrete' else decode_action(action))
+            if roll != NO_ROLL:
+                _set_state(env, roll=roll)
+
+        return env
+
+    def _scan_offsets(self):
+        # Offsets of all games when there is no index file
+        offsets = []
+        offset = FILE_HEADER.size
+        while offset < len(self.data):
+            offsets.append(offset)
+            num_moves = GAME_HEADER.unpack_from(self.data, offset)[-1]
+            offset += GAME_HEADER.size + num_moves * MOVE_RECORD_SIZE
+        return np.array(offsets, dtype=np.uint64)
+
+
+def _open_append(path, magic):
+    exists = os.path.exists(path) and os.path.getsize(path) > 0
+    if exists:
+        with open(path, 'rb') as f:
+            _check_header(f.read(FILE_HEADER.size), magic, path)
+    f = open(path, 'ab')
+    if not exists:
+        f.write(FILE_HEADER.pack(magic, VERSION, 0))
+    return f
+
+
+def _check_header(data, magic, path):
+    file_magic, version, _ = FILE_HEADER.unpack(bytes(data[:FILE_HEADER.size]))
+    assert file_magic == magic, f'{path} is not a replay file'
+    assert version == VERSION, f'{path} has unsupported version {version}'
+
+
+def _set_state(env, current_player=None, roll=None):
+    state = env.get_state()
+    if current_player is not None:
+        state.current_player = current_player
+        state.hash = get_state_hash(state)
+    if roll is not None:
+        state.roll = roll
+        state.dice = ROLLS[roll]
+    env.set_state(state)
@@ -0,0 +1,66 @@
+import numpy as np
+
+from .cant_stop_tables import ZOBRIST_CURRENT_PLAYER, ZOBRIST_PLAYER_MARKERS, ZOBRIST_TMP_MARKERS
+
+
+# Column lengths for columns 2-12, indexed by column - 2
+COLUMN_LENGTHS = np.array([3, 5, 7, 9, 11, 13, 11, 9, 7, 5, 3], dtype=np.int8)
+COLUMN_TOPS = COLUMN_LENGTHS - 1
+
+
+class CantStopState:
+    # Compact game state of CantStopEnv
+    # Marker positions are stored per column (index = column - 2), -1 = no marker
+    # The dice roll is kept both as sorted dice and as its index in ROLLS (see cant_stop_tables)
+    # Column bitmasks (column c = bit c - 2) are kept up to date with the markers, so legal moves
+    # can be looked up without scanning the board:
+    #   completed_columns: columns on which a player marker has reached the final slot (changed in _end_turn)
+    #   tmp_columns / tmp_completed_columns: columns with a tmp marker / a tmp marker on the final slot
+    # hash: Zobrist hash of markers and current player (see get_state_hash), kept up to date by CantStopEnv
+    # rng_state is only set on snapshots taken with CantStopEnv.get_state(include_rng=True)
+    __slots__ = ('player_markers', 'tmp_markers', 'current_player', 'dice', 'roll', 'winner', 'turn', 'move',
+                 'completed_columns', 'tmp_columns', 'tmp_completed_columns', 'hash', 'rng_state')
+
+    def __init__(self, num_players):
+        self.player_markers = np.full(shape=(num_players, 11), fill_value=-1, dtype=np.int8)
+        self.tmp_markers = np.full(shape=11, fill_value=-1, dtype=np.int8)
+        self.current_player = 0
+        self.dice = None
+        self.roll = None
+        self.winner = None
+        self.turn = 0
+        self.move = 0
+        self.completed_columns = 0
+        self.tmp_columns = 0
+        self.tmp_completed_columns = 0
+        self.hash = ZOBRIST_CURRENT_PLAYER[0]
+        self.rng_state = None
+
+    def copy(self):
+        state = CantStopState.__new__(CantStopState)
+        state.player_markers = self.player_markers.copy()
+        state.tmp_markers = self.tmp_markers.copy()
+        state.current_player = self.current_player
+        state.dice = self.dice # Dice are replaced on every roll, never modified in place
+        state.roll = self.roll
+        state.winner = self.winner
+        state.turn = self.turn
+        state.move = self.move
+        state.completed_columns = self.completed_columns
+        state.tmp_columns = self.tmp_columns
+        state.tmp_completed_columns = self.tmp_completed_columns
+        state.hash = self.hash
+        state.rng_state = self.rng_state
+        return state
+
+
+def get_state_hash(state):
+    # Zobrist hash of a state computed from scratch: XOR of the keys of all markers and the current player
+    state_hash = ZOBRIST_CURRENT_PLAYER[state.current_player]
+    for player, markers in enumerate(state.player_markers.tolist()):
+        for i, position in enumerate(markers):
+            state_hash ^= ZOBRIST_PLAYER_MARKERS[player][i][position + 1]
+    for i, position in enumerate(state.tmp_markers.tolist()):
+        state_hash ^= ZOBRIST_TMP_MARKERS[i][position + 1]
+    return state_hash
+
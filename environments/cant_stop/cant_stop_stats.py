@@ -0,0 +1,82 @@
+import numpy as np
+
+
+STATS_COUNTERS = ['rolls', 'turns', 'busts', 'columns_started', 'columns_completed', 'wins']
+
+
+class CantStopStats:
+    # Per-player counters, updated by CantStopEnv on every step
+    # Stats of several games (e.g. from different worker processes) are merged with + / +=
+    #   columns_started / columns_completed: columns with a marker between the first and final slot /
+    #   on the final slot, at the end of each game (or now, for a running game)
+    def __init__(self, num_players):
+        self.num_players = num_players
+        self.games = 0
+        for counter in STATS_COUNTERS:
+            setattr(self, counter, [0] * num_players)
+
+    def clear(self):
+        self.games = 0
+        for counter in STATS_COUNTERS:
+            values = getattr(self, counter)
+            values[:] = [0] * self.num_players
+
+    def record_action(self, player, move, bust):
+        self.rolls[player] += 1
+        if move == 0: # First action of a turn
+            self.turns[player] += 1
+        if bust:
+            self.busts[player] += 1
+
+    def record_columns(self, player, started, completed):
+        # Changes in the number of started / completed columns when a player's markers move up
+        self.columns_started[player] += started
+        self.columns_completed[player] += completed
+
+    def record_game_end(self, winner):
+        self.games += 1
+        self.wins[winner] += 1
+
+    def __iadd__(self, other):
+        assert self.num_players == other.num_players, 'Stats need to have the same number of players'
+        self.games += other.games
+        for counter in STATS_COUNTERS:
+            values, other_values = getattr(self, counter), getattr(other, counter)
+            values[:] = [v + o for v, o in zip(values, other_values)]
+        return self
+
+    def __add__(self, other):
+        stats = CantStopStats(self.num_players)
+        stats += self
+        stats += other
+        return stats
+
+    def to_dict(self):
+        # JSON-serializable counters, e.g. to store stats on disk
+        return {'num_players': self.num_players, 'games': self.games,
+                **{counter: list(getattr(self, counter)) for counter in STATS_COUNTERS}}
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls(data['num_players'])
+        stats.games = data['games']
+        for counter in STATS_COUNTERS:
+            getattr(stats, counter)[:] = data[counter]
+        return stats
+
+    def to_dataframe(self):
+        import pandas as pd
+
+        rolls, turns = np.array(self.rolls), np.array(self.turns)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rolls_per_turn = rolls / turns
+
+        return pd.DataFrame({
+            'Player': np.arange(self.num_players),
+            'Rolls': rolls,
+            'Turns': turns,
+            'Busts': self.busts,
+            'Rolls / turn': rolls_per_turn,
+            'Cols started': self.columns_started,
+            'Cols completed': self.columns_completed
+        })
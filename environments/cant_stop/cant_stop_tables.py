@@ -0,0 +1,151 @@
+from functools import lru_cache
+from itertools import combinations_with_replacement, product
+
+import numpy as np
+
+
+# Columns are represented as bits in masks: column c = bit c - 2
+COLUMN_BITS = 1 << np.arange(11)
+ALL_COLUMNS = (1 << 11) - 1
+
+# All 126 distinct sorted rolls of 4 dice
+ROLLS = np.array(list(combinations_with_replacement(range(1, 7), 4)), dtype=np.int8)
+ROLLS.flags.writeable = False
+NUM_ROLLS = len(ROLLS)
+
+# Index of the sorted roll for each of the 1296 ordered rolls, keyed by roll code (see roll_code)
+ROLL_INDEX = np.zeros(shape=6 ** 4, dtype=np.int64)
+_roll_lookup = {tuple(roll): r for r, roll in enumerate(ROLLS.tolist())}
+for _dice in product(range(1, 7), repeat=4):
+    ROLL_INDEX[np.dot(np.array(_dice) - 1, [216, 36, 6, 1])] = _roll_lookup[tuple(sorted(_dice))]
+
+# Number of ordered rolls that sort to each roll (sums up to 1296)
+ROLL_WEIGHTS = np.bincount(ROLL_INDEX, minlength=NUM_ROLLS)
+ROLL_PROBABILITIES = ROLL_WEIGHTS / ROLL_WEIGHTS.sum()
+
+# Pair sums for the three ways of splitting a sorted roll into two pairs, shape (126, 3, 2), sorted within each pair
+DICE_PAIRINGS = np.array([[0, 1, 2, 3], [0, 2, 1, 3], [0, 3, 1, 2]])
+_paired_dice = ROLLS[:, DICE_PAIRINGS].astype(np.int64)
+ROLL_PAIR_SUMS = np.sort(_paired_dice[:, :, [0, 2]] + _paired_dice[:, :, [1, 3]], axis=2)
+
+# Distinct pairs of sums for each roll, as tuples of column tuples
+ROLL_PAIRS = tuple(tuple(sorted(set(map(tuple, pairs)))) for pairs in ROLL_PAIR_SUMS.tolist())
+
+# Bitmask of the columns each roll can move on; legal moves only depend on these columns of the board
+ROLL_COLUMNS = [sum(1 << (c - 2) for c in set(pairs.ravel().tolist())) for pairs in ROLL_PAIR_SUMS]
+
+# Moves are enumerated once:
+# 0 = no move (bust), 1-11 = single column 2-12, 12-77 = column pairs (a, b) with a <= b
+MOVES = [tuple()] + [(c,) for c in range(2, 13)] + list(combinations_with_replacement(range(2, 13), 2))
+NUM_MOVES = len(MOVES)
+
+# Lookup of move index by columns tuple
+MOVE_IDS = {columns: m for m, columns in enumerate(MOVES)}
+
+# Lookup of move index by columns (single column: MOVE_INDEX[c, 0])
+MOVE_INDEX = np.zeros(shape=(13, 13), dtype=np.int64)
+for _m, _columns in enumerate(MOVES):
+    if len(_columns) == 1:
+        MOVE_INDEX[_columns[0], 0] = _m
+    elif len(_columns) == 2:
+        MOVE_INDEX[_columns[0], _columns[1]] = MOVE_INDEX[_columns[1], _columns[0]] = _m
+
+# Number of steps each move advances on each column
+MOVE_STEPS = np.zeros(shape=(NUM_MOVES, 11), dtype=np.int8)
+for _m, _columns in enumerate(MOVES):
+    for _c in _columns:
+        MOVE_STEPS[_m, _c - 2] += 1
+
+# Actions are encoded as integers:
+# 0 = bust, 2 * move - 1 = move and continue, 2 * move = move and stop
+NUM_ACTIONS = 2 * NUM_MOVES - 1
+
+# Boolean action mask without any legal action (e.g. once the game has ended)
+NO_ACTIONS = np.zeros(shape=NUM_ACTIONS, dtype=bool)
+NO_ACTIONS.flags.writeable = False
+
+# Zobrist keys (random 64-bit ints) for hashing game states, see CantStopState.hash
+# Marker keys are indexed by position + 1; position -1 (no marker) has key 0, so an empty board hashes to 0
+MAX_PLAYERS = 4
+ZOBRIST_SEED = 20240101
+_zobrist_keys = np.random.default_rng(ZOBRIST_SEED).integers(
+    0, np.iinfo(np.uint64).max, size=(MAX_PLAYERS + 1) * 11 * 14 + MAX_PLAYERS, dtype=np.uint64, endpoint=True
+)
+_zobrist_markers = _zobrist_keys[:(MAX_PLAYERS + 1) * 11 * 14].reshape(MAX_PLAYERS + 1, 11, 14)
+_zobrist_markers[:, :, 0] = 0
+ZOBRIST_PLAYER_MARKERS = _zobrist_markers[:MAX_PLAYERS].tolist()
+ZOBRIST_TMP_MARKERS = _zobrist_markers[MAX_PLAYERS].tolist()
+ZOBRIST_CURRENT_PLAYER = _zobrist_keys[-MAX_PLAYERS:].tolist()
+
+
+def encode_action(columns, continue_flag):
+    # Integer action of a (columns, continue_flag) action
+    move = MOVE_IDS[tuple(sorted(columns))]
+    return 0 if move == 0 else 2 * move - int(continue_flag)
+
+
+def decode_action(action):
+    # (columns, continue_flag) action of an integer action
+    return MOVES[(action + 1) // 2], action % 2 == 1
+
+
+def roll_code(dice):
+    # Position of an ordered roll of 4 dice in ROLL_INDEX
+    d0, d1, d2, d3 = dice
+    return (d0 - 1) * 216 + (d1 - 1) * 36 + (d2 - 1) * 6 + (d3 - 1)
+
+
+@lru_cache(maxsize=1 << 16)
+def get_legal_moves(roll, open_mask, tmp_mask, free_tmp_markers):
+    # Legal moves for a roll, following the same rules as CantStopEnv:
+    # open_mask: columns that can still be moved on
+    # tmp_mask: open columns that already have a tmp marker
+    # free_tmp_markers: number of tmp markers that have not been placed yet
+    possible_moves = []
+    for pair in ROLL_PAIRS[roll]:
+        pair_available = tuple(p for p in pair if open_mask >> (p - 2) & 1)
+
+        # If none of the columns of the pair are available, no move can be made using this pair
+        if len(pair_available) == 0:
+            continue
+
+        # If no more temp markers are available, only columns that are in tmp columns can be moved on
+        elif free_tmp_markers == 0:
+            pair_tmp = tuple(p for p in pair_available if tmp_mask >> (p - 2) & 1)
+            if len(pair_tmp) > 0:
+                possible_moves.append(pair_tmp)
+
+        # If enough free tmp markers for each pair (not already in tmp columns) are available, complete pair is possible
+        elif len({p for p in pair_available if not tmp_mask >> (p - 2) & 1}) <= free_tmp_markers:
+            possible_moves.append(pair_available)
+
+        # If only 1 free tmp marker but two columns, then add each individually
+        else:
+            possible_moves += [(p,) for p in pair_available]
+
+    # Add empty tuple (representing bust) if no moves are possible
+    if len(possible_moves) == 0:
+        possible_moves.append(tuple())
+
+    return tuple(possible_moves)
+
+
+@lru_cache(maxsize=1 << 16)
+def get_distinct_legal_moves(roll, open_mask, tmp_mask, free_tmp_markers):
+    # Legal moves without duplicates, ordered by move index (the order of the legal integer actions)
+    return tuple(sorted(set(get_legal_moves(roll, open_mask, tmp_mask, free_tmp_markers)), key=MOVE_IDS.get))
+
+
+@lru_cache(maxsize=1 << 16)
+def get_legal_action_mask(roll, open_mask, tmp_mask, free_tmp_markers):
+    # Boolean mask of legal integer actions, same arguments as get_legal_moves
+    mask = np.zeros(shape=NUM_ACTIONS, dtype=bool)
+    for columns in get_legal_moves(roll, open_mask, tmp_mask, free_tmp_markers):
+        move = MOVE_IDS[columns]
+        if move == 0:
+            mask[0] = True
+        else:
+            # Continue and stop
+            mask[2 * move - 1] = mask[2 * move] = True
+    mask.flags.writeable = False
+    return mask
@@ -3,26 +3,68 @@ import gymnasium as gym
 from gymnasium import spaces
 import numpy as np
 
+from .marrakech_tables import (
+    ASSAM_MOVES, DIE_FACES, DOMINO_INDEX, DOMINO_PLACEMENTS, NEIGHBOUR_MASKS, NUM_RUG_SLOTS, NUM_SQUARES,
+    RUG_CANDIDATES, RUG_SLOT_DOMINOES, get_region, get_square, is_on_board
+)
+
 class Direction(Enum):
     NORTH = 0
     EAST = 1
     SOUTH = 2
     WEST = 3
 
+DIRECTIONS = list(Direction)
+
+# Every turn takes two steps: first Assam is rotated (and moves), then a rug is placed
+ROTATE_PHASE, PLACE_PHASE = range(2)
+
+# Actions 0-2 turn Assam left / not at all / right, actions 3-14 place a rug on one of the 12 placements
+# next to Assam (in the order of marrakech_tables._get_rug_candidates)
+NUM_ROTATIONS = 3
+NUM_ACTIONS = NUM_ROTATIONS + NUM_RUG_SLOTS
+
 class MarrakechEnv(gym.Env):
-    def __init__(self, num_players=2):
+    # Turns of a player:
+    #   ROTATE_PHASE: the player turns Assam (never backwards), the die is rolled and Assam moves. If Assam lands on a
+    #     rug of another player, the current player pays them 1 dirham per square of the connected region of that
+    #     rug's colour under Assam. A player who can't pay gives all their dirhams and is out of the game
+    #   PLACE_PHASE: the player places a rug next to Assam
+    # The game ends when the remaining players have placed all their rugs (or only one player is left)
+    # Score: dirhams + visible rug squares, ties go to the player with more dirhams
+    def __init__(self, num_players=2, num_rugs=15, num_coins=30):
         super(MarrakechEnv, self).__init__()
 
         # The standard board is 7x7
         self.board_size = 7
         self.max_pos = self.board_size - 1
         self.num_players = num_players
-        self.num_rugs = 15
+        self.num_rugs = num_rugs
+        self.num_coins = num_coins
+
+        self.action_space = spaces.Discrete(NUM_ACTIONS)
+        self.observation_space = spaces.Dict({
+            'board': spaces.Box(low=-1, high=num_players - 1, shape=(self.board_size, self.board_size), dtype=np.int8),
+            'assam_pos': spaces.Box(low=0, high=self.max_pos, shape=(2,), dtype=np.int8),
+            'assam_dir': spaces.Discrete(len(DIRECTIONS)),
+            'coins': spaces.Box(low=0, high=num_players * num_coins, shape=(num_players,), dtype=np.int64),
+            'remaining_rugs': spaces.Box(low=0, high=num_rugs, shape=(num_players,), dtype=np.int64),
+            'eliminated': spaces.MultiBinary(num_players),
+            'current_player': spaces.Discrete(num_players),
+            'phase': spaces.Discrete(2),
+        })
+
+        self.reset()
+
+    def reset(self, seed=None, options=None):
+        # Seeds np_random (gymnasium), which is used for the starting player and all die rolls
+        super(MarrakechEnv, self).reset(seed=seed)
+        num_players = self.num_players
 
         # Board:
         # -1 = empty
         # 0, 1, 2, ... = rug of player 0, 1, 2, ...
-        self.board = np.full(shape=(self.board_size, self.board_size), fill_value=-1)
+        self.board = np.full(shape=(self.board_size, self.board_size), fill_value=-1, dtype=np.int8)
 
         # Assam's position: starting position is the centre of the board
         self.assam_pos = [self.board_size // 2, self.board_size // 2]
@@ -30,92 +72,199 @@ class MarrakechEnv(gym.Env):
         # Assam's direction:
         self.assam_dir = Direction.NORTH
 
-        # Remaining rugs:
+        # Remaining rugs, dirhams and players who are out of the game:
         self.remaining_rugs = [self.num_rugs for p in range(num_players)]
+        self.coins = [self.num_coins] * num_players
+        self.eliminated = [False] * num_players
+
+        # Rugs on the board as bitboards (see marrakech_tables), updated by place_rug:
+        # player_boards: squares showing a rug of each player
+        # full_rugs: bit d is set if domino d shows both halves of a single rug (which can't be covered completely)
+        # rug_ids: rug on top of each square (-1 = empty), rug_dominoes: domino covered by each rug
+        self.player_boards = [0] * num_players
+        self.full_rugs = 0
+        self.rug_ids = [-1] * NUM_SQUARES
+        self.rug_dominoes = []
+
+        self.current_player = int(self.np_random.integers(0, num_players))
+        self.phase = ROTATE_PHASE
+        self.die_roll = None
+        self.payment = 0
+        self.scores = None
+        self.winner = None
+
+        return self._get_observation(), self._get_info()
+
+    def step(self, action):
+        assert self.winner is None, 'The game has already ended'
+        assert self.get_action_mask()[action], 'Impossible action'
+        player = self.current_player
+
+        terminated = False
+        if self.phase == ROTATE_PHASE:
+            self._rotate_assam(action)
+            self.die_roll = self._roll_die()
+            self._move_assam(self.die_roll)
+            self._pay_rug_owner()
+            if self.eliminated[player]:
+                terminated = self._end_turn()
+            else:
+                self.phase = PLACE_PHASE
+        else:
+            x, y = self.assam_pos
+            domino = RUG_SLOT_DOMINOES[get_square(x, y)][action - NUM_ROTATIONS]
+            self.place_rug(player, DOMINO_PLACEMENTS[domino])
+            terminated = self._end_turn()
+
+        reward = 1 if terminated and self.winner == player else 0
+        return self._get_observation(), reward, terminated, False, self._get_info()
+
+    def get_action_mask(self):
+        # Boolean mask of the legal actions (all False once the game has ended)
+        mask = np.zeros(shape=NUM_ACTIONS, dtype=bool)
+        if self.winner is not None:
+            return mask
+        if self.phase == ROTATE_PHASE:
+            mask[:NUM_ROTATIONS] = True
+        else:
+            x, y = self.assam_pos
+            full_rugs = self.full_rugs
+            for slot, domino in enumerate(RUG_SLOT_DOMINOES[get_square(x, y)]):
+                mask[NUM_ROTATIONS + slot] = domino >= 0 and not full_rugs >> domino & 1
+        return mask
+
+    def get_possible_actions(self):
+        return np.flatnonzero(self.get_action_mask()).tolist()
+
+    def get_payment(self, player):
+        # Dirhams player owes for Assam's square: size of the connected region of the colour under Assam
+        # (0 on empty squares, own rugs and rugs of players who are out of the game)
+        x, y = self.assam_pos
+        owner = int(self.board[x, y])
+        if owner < 0 or owner == player or self.eliminated[owner]:
+            return owner, 0
+        region = get_region(self.player_boards[owner], get_square(x, y))
+        return owner, bin(region).count('1')
+
+    def get_scores(self):
+        # Dirhams + visible rug squares of every player
+        visible_rugs = np.bincount(self.board.ravel() + 1, minlength=self.num_players + 1)[1:]
+        return visible_rugs + np.array(self.coins)
+
+    def _rotate_assam(self, action):
+        # 0 = turn left, 1 = keep direction, 2 = turn right
+        self.assam_dir = DIRECTIONS[(self.assam_dir.value + action - 1) % len(DIRECTIONS)]
+
+    def _pay_rug_owner(self):
+        player = self.current_player
+        owner, amount = self.get_payment(player)
+        self.payment = min(amount, self.coins[player])
+        if self.payment > 0:
+            self.coins[player] -= self.payment
+            self.coins[owner] += self.payment
+        if self.payment < amount:
+            # Players who can't pay are out of the game, their rugs stay on the board
+            self.eliminated[player] = True
+            self.remaining_rugs[player] = 0
+
+    def _end_turn(self):
+        # Move on to the next player who is still in the game, or end the game
+        # Returns whether the game has ended
+        self.phase = ROTATE_PHASE
+        players_left = [p for p in range(self.num_players) if not self.eliminated[p]]
+        if len(players_left) <= 1 or not any(self.remaining_rugs[p] for p in players_left):
+            self._end_game(players_left)
+            return True
+
+        player = self.current_player
+        while True:
+            player = (player + 1) % self.num_players
+            if self.remaining_rugs[player] > 0:
+                self.current_player = player
+                return False
+
+    def _end_game(self, players_left):
+        self.scores = self.get_scores()
+        coins = self.coins
+        # Ties in score and dirhams go to the first player
+        self.winner = max(players_left, key=lambda p: (self.scores[p], coins[p]))
+
+    def _get_observation(self):
+        return {
+            'board': self.board.copy(),
+            'assam_pos': np.array(self.assam_pos, dtype=np.int8),
+            'assam_dir': self.assam_dir.value,
+            'coins': np.array(self.coins),
+            'remaining_rugs': np.array(self.remaining_rugs),
+            'eliminated': np.array(self.eliminated, dtype=np.int8),
+            'current_player': self.current_player,
+            'phase': self.phase,
+        }
+
+    def _get_info(self):
+        return {
+            'action_mask': self.get_action_mask(),
+            'die_roll': self.die_roll,
+            'payment': self.payment,
+            'winner': self.winner,
+        }
 
     def _move_assam(self, die_roll):
-        for _ in range(die_roll):
-            new_x, new_y = self.assam_pos
-
-            if self.assam_dir == Direction.NORTH: # North (rows -> x)
-                new_x -= 1
-            if self.assam_dir == Direction.EAST: # East (cols -> y)
-                new_y += 1
-            if self.assam_dir == Direction.SOUTH: # South
-                new_x += 1
-            if self.assam_dir == Direction.WEST: # West
-                new_y -= 1
-
-            # Assam hit North border
-            if new_x < 0:
-                new_x = 0
-                if new_y == self.max_pos:
-                    self.assam_dir = Direction.WEST
-                else:
-                    # If on even y position, move 1 to the right, else one to the left
-                    new_y = new_y + 1 if new_y % 2 == 0 else new_y - 1
-                    self.assam_dir = Direction.SOUTH
-
-            # Assam hit East border
-            if new_y > self.max_pos:
-                new_y = self.max_pos
-                if new_x == 0:
-                    self.assam_dir = Direction.SOUTH
-                else:
-                # If on even x position, move 1 to the top, else one to the bottom
-                    new_x = new_x - 1 if new_x % 2 == 0 else new_x + 1
-                    self.assam_dir = Direction.WEST
-
-            # Assam hit South border
-            if new_x > self.max_pos:
-                new_x = self.max_pos
-                if new_y == 0:
-                    self.assam_dir = Direction.EAST
-                else:
-                    # If on even y position, move 1 to the left, else one to the right
-                    new_y = new_y - 1 if new_y % 2 == 0 else new_y + 1
-                    self.assam_dir = Direction.NORTH
-
-            # Assam hit West border
-            if new_y < 0:
-                new_y = 0
-                if new_x == self.max_pos:
-                    self.assam_dir = Direction.NORTH
-                else:
-                # If on even x position, move 1 to the bottom, else one to the top
-                    new_x = new_x + 1 if new_x % 2 == 0 else new_x - 1
-                    self.assam_dir = Direction.EAST
-
-            self.assam_pos = [new_x, new_y]
+        # Look up Assam's position and direction after moving die_roll squares (see marrakech_tables)
+        x, y = self.assam_pos
+        new_x, new_y, direction = ASSAM_MOVES[x][y][self.assam_dir.value][die_roll]
+        self.assam_pos = [new_x, new_y]
+        self.assam_dir = DIRECTIONS[direction]
 
     def _get_state(self):
         state = {
             'board': self.board,
             'assam_pos': self.assam_pos,
             'assam_dir': self.assam_dir,
-            'remaining_rugs': self.remaining_rugs
+            'remaining_rugs': self.remaining_rugs,
+            'coins': self.coins,
+            'eliminated': self.eliminated
         }
         return state
 
     def get_rug_pos_candidates(self):
+        # Rug placements next to Assam that lie on the board, as ((x1, y1), (x2, y2))
+        x, y = self.assam_pos
+        return [placement for _, placement in RUG_CANDIDATES[get_square(x, y)]]
+
+    def get_legal_rug_placements(self):
+        # Rug placements next to Assam that don't completely cover a single rug
         x, y = self.assam_pos
-        candidates = [
-            ([x-2, y],      [x-1, y]),      # Top, pointing north
-            ([x-1, y-1],    [x-1, y]),      # Top, pointing west
-            ([x-1, y],      [x-1, y+1]),    # Top, pointing east
-            ([x+1, y],      [x+2, y]),      # Bottom, pointing south
-            ([x+1, y-1],    [x+1, y]),      # Bottom, pointing west
-            ([x+1, y],      [x+1, y+1]),    # Bottom, pointing east
-            ([x, y+1],      [x, y+2]),      # Right, pointing east
-            ([x-1, y+1],    [x, y+1]),      # Right, pointing north
-            ([x, y+1],      [x+1, y+1]),    # Right, pointing south
-            ([x, y-2],      [x, y-1]),      # Left, pointing west
-            ([x-1, y-1],    [x, y-1]),      # Left, pointing north
-            ([x, y-1],      [x+1, y-1]),    # Left, pointing south
-        ]
-        return candidates
+        full_rugs = self.full_rugs
+        return [placement for domino, placement in RUG_CANDIDATES[get_square(x, y)] if not full_rugs >> domino & 1]
+
+    def place_rug(self, player, placement):
+        (x1, y1), (x2, y2) = placement
+        assert is_on_board(x1, y1) and is_on_board(x2, y2), 'Rugs have to be placed on the board'
+        a, b = sorted((get_square(x1, y1), get_square(x2, y2)))
+        domino = DOMINO_INDEX.get((a, b))
+        assert domino is not None, 'Rugs have to cover two adjacent squares'
+        mask = (1 << a) | (1 << b)
+        assam = get_square(*self.assam_pos)
+        assert mask & NEIGHBOUR_MASKS[assam] and not mask >> assam & 1, 'Rugs have to be placed next to Assam'
+        assert not self.full_rugs >> domino & 1, 'Rugs cannot completely cover another rug'
+        assert self.remaining_rugs[player] > 0, 'No rugs left'
+
+        # Rugs losing a square can't be covered completely anymore
+        for square in (a, b):
+            covered_rug = self.rug_ids[square]
+            if covered_rug >= 0:
+                self.full_rugs &= ~(1 << self.rug_dominoes[covered_rug])
+            self.rug_ids[square] = len(self.rug_dominoes)
+        self.rug_dominoes.append(domino)
+        self.full_rugs |= 1 << domino
+
+        for p in range(self.num_players):
+            self.player_boards[p] &= ~mask
+        self.player_boards[player] |= mask
+
+        self.board[x1, y1] = self.board[x2, y2] = player
+        self.remaining_rugs[player] -= 1
 
     def _roll_die(self):
-        values = [1, 2, 3, 4]
-        weights = [1/6, 1/3, 1/3, 1/6]
-        return np.random.choice(values, p=weights)
+        return DIE_FACES[self.np_random.integers(len(DIE_FACES))]
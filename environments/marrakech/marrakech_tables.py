@@ -0,0 +1,196 @@
+import numpy as np
+
+
+BOARD_SIZE = 7
+MAX_POS = BOARD_SIZE - 1
+
+# Directions, with the values of marrakech_env.Direction
+NORTH, EAST, SOUTH, WEST = range(4)
+NUM_DIRECTIONS = 4
+
+# Die rolls move Assam 1-4 squares, the die shows 1 and 4 once and 2 and 3 twice
+MAX_ROLL = 4
+DIE_FACES = [1, 2, 2, 3, 3, 4]
+
+# Squares are numbered x * BOARD_SIZE + y, square s = bit s of a bitboard (Python int)
+NUM_SQUARES = BOARD_SIZE * BOARD_SIZE
+
+
+def _move_one_square(x, y, direction):
+    # Move Assam one square (x = row, y = column), turning at the borders following the mosaics
+    # Returns the new position and direction
+    if direction == NORTH:
+        x -= 1
+    if direction == EAST:
+        y += 1
+    if direction == SOUTH:
+        x += 1
+    if direction == WEST:
+        y -= 1
+
+    # Assam hit North border
+    if x < 0:
+        x = 0
+        if y == MAX_POS:
+            direction = WEST
+        else:
+            # If on even y position, move 1 to the right, else one to the left
+            y = y + 1 if y % 2 == 0 else y - 1
+            direction = SOUTH
+
+    # Assam hit East border
+    if y > MAX_POS:
+        y = MAX_POS
+        if x == 0:
+            direction = SOUTH
+        else:
+            # If on even x position, move 1 to the top, else one to the bottom
+            x = x - 1 if x % 2 == 0 else x + 1
+            direction = WEST
+
+    # Assam hit South border
+    if x > MAX_POS:
+        x = MAX_POS
+        if y == 0:
+            direction = EAST
+        else:
+            # If on even y position, move 1 to the left, else one to the right
+            y = y - 1 if y % 2 == 0 else y + 1
+            direction = NORTH
+
+    # Assam hit West border
+    if y < 0:
+        y = 0
+        if x == MAX_POS:
+            direction = NORTH
+        else:
+            # If on even x position, move 1 to the bottom, else one to the top
+            x = x + 1 if x % 2 == 0 else x - 1
+            direction = EAST
+
+    return x, y, direction
+
+
+# Assam's moves for every position, direction and die roll (0 = no move), indexed [x, y, direction, roll]:
+#   ASSAM_POSITIONS: position [x, y] after the move
+#   ASSAM_DIRECTIONS: direction after the move
+#   ASSAM_PATHS: the squares Assam moves onto, one per step of the roll ([-1, -1] after the last step)
+#   ASSAM_MOVES: nested lists of (x, y, direction) after the move, for fast lookups of single moves
+ASSAM_POSITIONS = np.zeros(shape=(BOARD_SIZE, BOARD_SIZE, NUM_DIRECTIONS, MAX_ROLL + 1, 2), dtype=np.int8)
+ASSAM_DIRECTIONS = np.zeros(shape=(BOARD_SIZE, BOARD_SIZE, NUM_DIRECTIONS, MAX_ROLL + 1), dtype=np.int8)
+ASSAM_PATHS = np.full(shape=(BOARD_SIZE, BOARD_SIZE, NUM_DIRECTIONS, MAX_ROLL + 1, MAX_ROLL, 2), fill_value=-1, dtype=np.int8)
+ASSAM_MOVES = [[[[None] * (MAX_ROLL + 1) for _ in range(NUM_DIRECTIONS)] for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
+for _x in range(BOARD_SIZE):
+    for _y in range(BOARD_SIZE):
+        for _direction in range(NUM_DIRECTIONS):
+            _move = (_x, _y, _direction)
+            for _roll in range(MAX_ROLL + 1):
+                if _roll > 0:
+                    _move = _move_one_square(*_move)
+                    ASSAM_PATHS[_x, _y, _direction, _roll:, _roll - 1] = _move[:2]
+                ASSAM_POSITIONS[_x, _y, _direction, _roll] = _move[:2]
+                ASSAM_DIRECTIONS[_x, _y, _direction, _roll] = _move[2]
+                ASSAM_MOVES[_x][_y][_direction][_roll] = _move
+for _table in [ASSAM_POSITIONS, ASSAM_DIRECTIONS, ASSAM_PATHS]:
+    _table.flags.writeable = False
+
+
+def move_assam(positions, directions, rolls):
+    # Move Assam in many games at once
+    # positions: (N, 2) array of [x, y], directions: (N,) array of direction values, rolls: (N,) array of die rolls
+    # Returns the new positions, new directions and paths (N, 4, 2), see ASSAM_PATHS
+    x, y = positions[:, 0], positions[:, 1]
+    return (
+        ASSAM_POSITIONS[x, y, directions, rolls],
+        ASSAM_DIRECTIONS[x, y, directions, rolls],
+        ASSAM_PATHS[x, y, directions, rolls]
+    )
+
+
+def get_square(x, y):
+    return x * BOARD_SIZE + y
+
+
+def is_on_board(x, y):
+    return 0 <= x <= MAX_POS and 0 <= y <= MAX_POS
+
+
+# Rugs cover dominoes: two horizontally or vertically adjacent squares (a, b) with a < b
+DOMINOES = (
+    [(get_square(x, y), get_square(x, y + 1)) for x in range(BOARD_SIZE) for y in range(MAX_POS)] +
+    [(get_square(x, y), get_square(x + 1, y)) for x in range(MAX_POS) for y in range(BOARD_SIZE)]
+)
+NUM_DOMINOES = len(DOMINOES)
+DOMINO_INDEX = {domino: d for d, domino in enumerate(DOMINOES)}
+DOMINO_MASKS = np.array([(1 << a) | (1 << b) for a, b in DOMINOES], dtype=np.uint64)
+
+# Bitboard of the squares next to each square (orthogonally)
+NEIGHBOUR_MASKS = [
+    sum(1 << get_square(x + dx, y + dy) for dx, dy in [(-1, 0), (1, 0), (0, -1), (0, 1)] if is_on_board(x + dx, y + dy))
+    for x in range(BOARD_SIZE) for y in range(BOARD_SIZE)
+]
+
+
+def _get_rug_candidates(x, y):
+    # All rug placements next to Assam at (x, y), including the ones leaving the board
+    return [
+        ((x-2, y),      (x-1, y)),      # Top, pointing north
+        ((x-1, y-1),    (x-1, y)),      # Top, pointing west
+        ((x-1, y),      (x-1, y+1)),    # Top, pointing east
+        ((x+1, y),      (x+2, y)),      # Bottom, pointing south
+        ((x+1, y-1),    (x+1, y)),      # Bottom, pointing west
+        ((x+1, y),      (x+1, y+1)),    # Bottom, pointing east
+        ((x, y+1),      (x, y+2)),      # Right, pointing east
+        ((x-1, y+1),    (x, y+1)),      # Right, pointing north
+        ((x, y+1),      (x+1, y+1)),    # Right, pointing south
+        ((x, y-2),      (x, y-1)),      # Left, pointing west
+        ((x-1, y-1),    (x, y-1)),      # Left, pointing north
+        ((x, y-1),      (x+1, y-1)),    # Left, pointing south
+    ]
+
+
+# Rug placements next to Assam that lie on the board, for each square of Assam:
+#   RUG_CANDIDATES: lists of (domino index, ((x1, y1), (x2, y2)))
+#   RUG_CANDIDATE_MASKS: (49, 12) bitboards of the placements (0 = off the board), e.g. for batches of games
+#   RUG_SLOT_DOMINOES: domino index of each of the 12 placements of _get_rug_candidates (-1 = off the board),
+#     the slots are the rug actions of MarrakechEnv
+NUM_RUG_SLOTS = 12
+RUG_CANDIDATES = []
+RUG_CANDIDATE_MASKS = np.zeros(shape=(NUM_SQUARES, NUM_RUG_SLOTS), dtype=np.uint64)
+RUG_SLOT_DOMINOES = []
+for _x in range(BOARD_SIZE):
+    for _y in range(BOARD_SIZE):
+        _candidates = []
+        _slot_dominoes = [-1] * NUM_RUG_SLOTS
+        for _i, _placement in enumerate(_get_rug_candidates(_x, _y)):
+            if all(is_on_board(*_position) for _position in _placement):
+                _domino = DOMINO_INDEX[tuple(sorted(get_square(*_position) for _position in _placement))]
+                _candidates.append((_domino, _placement))
+                _slot_dominoes[_i] = _domino
+                RUG_CANDIDATE_MASKS[get_square(_x, _y), _i] = DOMINO_MASKS[_domino]
+        RUG_CANDIDATES.append(_candidates)
+        RUG_SLOT_DOMINOES.append(_slot_dominoes)
+RUG_CANDIDATE_MASKS.flags.writeable = False
+
+# Squares of each domino, as ((x1, y1), (x2, y2))
+DOMINO_PLACEMENTS = [((a // BOARD_SIZE, a % BOARD_SIZE), (b // BOARD_SIZE, b % BOARD_SIZE)) for a, b in DOMINOES]
+
+# Squares with a neighbour to the east / west, to keep flood fills from wrapping around rows
+NOT_EAST_EDGE = sum(1 << get_square(x, y) for x in range(BOARD_SIZE) for y in range(MAX_POS))
+NOT_WEST_EDGE = sum(1 << get_square(x, y) for x in range(BOARD_SIZE) for y in range(1, BOARD_SIZE))
+
+
+def get_region(squares, square):
+    # Bitboard of the connected region of the bitboard `squares` that contains `square` (0 if not in squares)
+    # The region grows by all its neighbours at once, so this takes one iteration per step of its longest path
+    region = 1 << square & squares
+    while region:
+        grown = (
+            region | region << BOARD_SIZE | region >> BOARD_SIZE |
+            (region & NOT_EAST_EDGE) << 1 | (region & NOT_WEST_EDGE) >> 1
+        ) & squares
+        if grown == region:
+            break
+        region = grown
+    return region
+
@@ -0,0 +1,42 @@
+# Measures the time to import the Can't Stop environment and step a game headlessly, in a fresh interpreter,
+# and fails if notebook / dataframe / terminal colour libraries get imported along the way
+
+import subprocess
+import sys
+import os
+
+REPEATS = 5
+MAX_IMPORT_TIME = 1.0 # seconds
+FORBIDDEN_MODULES = ['pandas', 'IPython', 'colorama']
+
+CODE = f"""
+import sys, time
+start = time.perf_counter()
+from environments.cant_stop import CantStopEnv
+env = CantStopEnv(num_players=2)
+import_time = time.perf_counter() - start
+
+obs, info = env.reset()
+for _ in range(100):
+    obs, reward, terminated, truncated, info = env.step(env.get_possible_actions()[0])
+    if terminated:
+        obs, info = env.reset()
+
+loaded = [m for m in {FORBIDDEN_MODULES!r} if m in sys.modules]
+print(import_time, ','.join(loaded))
+"""
+
+repo_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+env = dict(os.environ, PYTHONPATH=repo_root)
+
+import_times = []
+for _ in range(REPEATS):
+    output = subprocess.run([sys.executable, '-c', CODE], env=env, capture_output=True, text=True, check=True).stdout
+    import_time, _, loaded = output.strip().partition(' ')
+    import_times.append(float(import_time))
+
+    assert not loaded, f'Headless import loaded {loaded}'
+
+best_import_time = min(import_times)
+print(f'Import time: {best_import_time * 1000:.0f} ms (best of {REPEATS})')
+assert best_import_time < MAX_IMPORT_TIME, f'Import takes longer than {MAX_IMPORT_TIME} s'
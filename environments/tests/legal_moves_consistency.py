@@ -0,0 +1,72 @@
+import random
+
+import numpy as np
+
+from environments.cant_stop import CantStopBatchEnv, CantStopEnv
+from environments.cant_stop.cant_stop_probabilities import (
+    get_bust_probability, get_column_masks, get_expected_progress
+)
+from environments.cant_stop.cant_stop_tables import NUM_ROLLS, ROLLS, ROLL_PROBABILITIES, get_legal_moves
+from policies.cant_stop import StopAfterNRollsPolicy
+
+# The legal move rules exist three times: CantStopEnv (cant_stop_tables.get_legal_moves), CantStopBatchEnv and the
+# probability tables (cant_stop_probabilities.compute_tables). This checks that they agree on states of played games.
+
+NUM_STATES = 4000
+STATES_PER_GAME = 200
+SEED = 0
+
+rng = random.Random(SEED)
+
+# States of games between StopAfterNRollsPolicy players with random n, one state per step of the first steps
+states = []
+while len(states) < NUM_STATES:
+    num_players = rng.randint(2, 4)
+    env = CantStopEnv(num_players=num_players, history_mode='none')
+    env.reset(seed=rng.getrandbits(32))
+    policies = [StopAfterNRollsPolicy(rng.randint(2, 12), seed=rng.getrandbits(32)) for _ in range(num_players)]
+    for _ in range(STATES_PER_GAME):
+        if env.winner is not None or len(states) == NUM_STATES:
+            break
+        states.append((num_players, env.get_state(), env._get_action_mask().copy()))
+        env.step(policies[env.current_player].select_action(env.get_possible_actions()))
+
+# Batch engine: same states, legal moves recomputed from the arrays
+mismatches = 0
+for num_players in [2, 3, 4]:
+    player_states = [(state, mask) for n, state, mask in states if n == num_players]
+    batch_env = CantStopBatchEnv(len(player_states), num_players=num_players)
+    for game, (state, _) in enumerate(player_states):
+        batch_env.player_markers[game] = state.player_markers
+        batch_env.tmp_markers[game] = state.tmp_markers
+        batch_env.current_player[game] = state.current_player
+        batch_env.roll[game] = state.roll
+        batch_env.dice[game] = ROLLS[state.roll]
+    batch_env._update_legal_moves(batch_env.games)
+
+    batch_masks = batch_env.get_legal_action_mask()
+    scalar_masks = np.array([mask for _, mask in player_states])
+    mismatches += int((batch_masks != scalar_masks).any(axis=1).sum())
+
+print(f'Batch engine: {mismatches} of {len(states)} states with different legal actions')
+assert mismatches == 0
+
+# Probability tables: bust probability and expected progress over all rolls, from the scalar rules
+mismatches = 0
+for _, state, _ in states:
+    tmp_mask, blocked_mask = get_column_masks(state)
+    open_mask = ~blocked_mask & ((1 << 11) - 1)
+    free_tmp_markers = 3 - bin(tmp_mask).count('1')
+    bust_probability = expected_progress = 0.0
+    for roll in range(NUM_ROLLS):
+        moves = get_legal_moves(roll, open_mask, tmp_mask & open_mask, free_tmp_markers)
+        steps = max(len(columns) for columns in moves)
+        bust_probability += ROLL_PROBABILITIES[roll] * (steps == 0)
+        expected_progress += ROLL_PROBABILITIES[roll] * steps
+
+    if not (np.isclose(bust_probability, get_bust_probability(tmp_mask, blocked_mask), atol=1e-6) and
+            np.isclose(expected_progress, get_expected_progress(tmp_mask, blocked_mask), atol=1e-5)):
+        mismatches += 1
+
+print(f'Probability tables: {mismatches} of {len(states)} states with different bust probability / progress')
+assert mismatches == 0
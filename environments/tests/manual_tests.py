@@ -1,20 +1,15 @@
 from environments.marrakech import MarrakechEnv
 from collections import Counter
 
-max_pos = 6
 marrakech = MarrakechEnv()
 
 marrakech.assam_pos = [0, 0]
 
-candidates = marrakech.get_rug_pos_candidates()
+# Candidates only contain placements on the board
+filtered = marrakech.get_rug_pos_candidates()
 
-# for can in candidates:
+# for can in filtered:
 #     print(can)
-# print(candidates)
-filtered = [
-    candidate for candidate in candidates
-    if all(0 <= coord <= max_pos for point in candidate for coord in point)
-]
 
 
 import matplotlib.pyplot as plt
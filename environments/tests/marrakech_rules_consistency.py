@@ -0,0 +1,138 @@
+import random
+
+import numpy as np
+
+from environments.marrakech import MarrakechEnv
+from environments.marrakech.marrakech_env import NUM_ROTATIONS, PLACE_PHASE, ROTATE_PHASE
+from environments.marrakech.marrakech_tables import DOMINO_PLACEMENTS, RUG_SLOT_DOMINOES, get_square
+
+# MarrakechEnv keeps the rugs as bitboards (payment regions, rugs that can't be covered completely) and skips players
+# who are out of the game. This plays random games and checks every step against naive versions of the rules computed
+# from the board: flood fill for payments, a board of rug ids for placements, and turn order and scores from scratch.
+
+NUM_GAMES = 500
+SEED = 0
+
+rng = random.Random(SEED)
+
+
+def get_naive_region(board, x, y):
+    # Squares connected to (x, y) through squares of the same colour
+    colour = board[x, y]
+    region = {(x, y)}
+    stack = [(x, y)]
+    while stack:
+        x, y = stack.pop()
+        for nx, ny in [(x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)]:
+            if 0 <= nx < len(board) and 0 <= ny < len(board) and (nx, ny) not in region and board[nx, ny] == colour:
+                region.add((nx, ny))
+                stack.append((nx, ny))
+    return region
+
+
+def get_naive_placements(rug_ids, x, y):
+    # Placements (as sets of two squares) next to Assam that don't cover both squares of a single rug
+    size = len(rug_ids)
+    placements = set()
+    for ax, ay in [(x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)]:
+        for bx, by in [(ax - 1, ay), (ax + 1, ay), (ax, ay - 1), (ax, ay + 1)]:
+            if not (0 <= ax < size and 0 <= ay < size and 0 <= bx < size and 0 <= by < size) or (bx, by) == (x, y):
+                continue
+            if rug_ids[ax, ay] >= 0 and rug_ids[ax, ay] == rug_ids[bx, by]:
+                continue
+            placements.add(frozenset([(ax, ay), (bx, by)]))
+    return placements
+
+
+def get_placement(env, action):
+    # Squares of the placement of a PLACE_PHASE action
+    domino = RUG_SLOT_DOMINOES[get_square(*env.assam_pos)][action - NUM_ROTATIONS]
+    return frozenset(DOMINO_PLACEMENTS[domino])
+
+
+mismatches = {'payment': 0, 'elimination': 0, 'placement mask': 0, 'placement': 0, 'turn order': 0, 'winner': 0}
+counts = {'payments': 0, 'eliminations': 0, 'skipped turns': 0, 'placements': 0}
+for _ in range(NUM_GAMES):
+    num_players = rng.randint(2, 4)
+    # Few dirhams, so players run out of money and are eliminated
+    env = MarrakechEnv(num_players=num_players, num_coins=rng.choice([3, 10, 30]))
+    env.reset(seed=rng.getrandbits(32))
+    rug_ids = np.full(shape=env.board.shape, fill_value=-1, dtype=np.int64)
+    num_rugs = 0
+
+    while env.winner is None:
+        player = env.current_player
+        board = env.board.copy()
+        coins = list(env.coins)
+        eliminated = list(env.eliminated)
+        remaining_rugs = list(env.remaining_rugs)
+
+        if env.phase == PLACE_PHASE:
+            mask_placements = {get_placement(env, action) for action in env.get_possible_actions()}
+            if mask_placements != get_naive_placements(rug_ids, *env.assam_pos):
+                mismatches['placement mask'] += 1
+
+        action = rng.choice(env.get_possible_actions())
+        phase = env.phase
+        placement = get_placement(env, action) if phase == PLACE_PHASE else None
+        env.step(action)
+
+        if phase == ROTATE_PHASE:
+            # Pay the owner of the region under Assam, or everything and leave the game
+            x, y = env.assam_pos
+            owner = board[x, y]
+            amount = 0
+            if owner >= 0 and owner != player and not eliminated[owner]:
+                amount = len(get_naive_region(board, x, y))
+            expected_coins = list(coins)
+            expected_coins[player] -= min(amount, coins[player])
+            if owner >= 0:
+                expected_coins[owner] += min(amount, coins[player])
+            if env.payment != min(amount, coins[player]) or env.coins != expected_coins:
+                mismatches['payment'] += 1
+            counts['payments'] += amount > 0
+
+            out = amount > coins[player]
+            if env.eliminated[player] != out or (out and env.remaining_rugs[player] != 0):
+                mismatches['elimination'] += 1
+            counts['eliminations'] += out
+            remaining_rugs[player] = 0 if out else remaining_rugs[player]
+            eliminated[player] = out
+            turn_ended = out
+        else:
+            for x, y in placement:
+                rug_ids[x, y] = num_rugs
+            num_rugs += 1
+            expected_board = board.copy()
+            for x, y in placement:
+                expected_board[x, y] = player
+            remaining_rugs[player] -= 1
+            if (env.board != expected_board).any() or env.remaining_rugs != remaining_rugs:
+                mismatches['placement'] += 1
+            counts['placements'] += 1
+            turn_ended = True
+
+        if not turn_ended:
+            continue
+
+        # Next player in turn order who is still in the game and has rugs left, or the end of the game
+        players_left = [p for p in range(num_players) if not eliminated[p]]
+        next_players = [
+            p for p in [(player + k) % num_players for k in range(1, num_players + 1)]
+            if not eliminated[p] and remaining_rugs[p] > 0
+        ]
+        if len(players_left) <= 1 or not next_players:
+            scores = [int((env.board == p).sum()) + env.coins[p] for p in range(num_players)]
+            best = max((scores[p], env.coins[p]) for p in players_left)
+            winner = next(p for p in players_left if (scores[p], env.coins[p]) == best)
+            if env.winner != winner or list(env.scores) != scores:
+                mismatches['winner'] += 1
+        else:
+            if env.winner is not None or env.current_player != next_players[0]:
+                mismatches['turn order'] += 1
+            counts['skipped turns'] += next_players[0] != (player + 1) % num_players
+
+print(f'{NUM_GAMES} games: ' + ', '.join(f'{count} {name}' for name, count in counts.items()))
+for name, count in mismatches.items():
+    print(f'{name}: {count} mismatches')
+assert not any(mismatches.values())
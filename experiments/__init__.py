@@ -0,0 +1,3 @@
+from .cant_stop import run_adaptive_tournament, run_tournament
+
+__all__ = ['run_adaptive_tournament', 'run_tournament']
\ No newline at end of file
@@ -0,0 +1,4 @@
+from .result_store import ResultStore
+from .tournament import run_adaptive_tournament, run_tournament, wilson_interval
+
+__all__ = ['ResultStore', 'run_adaptive_tournament', 'run_tournament', 'wilson_interval']
\ No newline at end of file
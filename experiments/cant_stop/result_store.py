@@ -0,0 +1,76 @@
+from functools import partial
+import json
+import os
+
+from environments.cant_stop.cant_stop_env import ENV_VERSION
+from environments.cant_stop.cant_stop_stats import CantStopStats
+
+
+def get_policy_config(factory):
+    # JSON-serializable description of a policy factory, e.g. partial(StopAfterNRollsPolicy, 10) ->
+    # {'policy': 'policies.cant_stop.stop_after_n_rolls_policy.StopAfterNRollsPolicy', 'args': [10], 'kwargs': {}}
+    # Arguments that aren't JSON types are described by their repr
+    if isinstance(factory, partial):
+        config = get_policy_config(factory.func)
+        config['args'] = config['args'] + list(factory.args)
+        config['kwargs'] = {**config['kwargs'], **factory.keywords}
+        return json.loads(json.dumps(config, default=repr))
+    return {'policy': f'{factory.__module__}.{factory.__qualname__}', 'args': [], 'kwargs': {}}
+
+
+def get_shard_key(policy_factories, seed, num_games, seed_every_game=False):
+    # Shards are identified by everything that decides their games: environment version, policies, number of
+    # players and the seed and number of games (the seed range) of the shard
+    return json.dumps({
+        'env_version': ENV_VERSION,
+        'policies': [get_policy_config(factory) for factory in policy_factories],
+        'num_players': len(policy_factories),
+        'seed': seed,
+        'num_games': num_games,
+        'seed_every_game': seed_every_game,
+    }, sort_keys=True)
+
+
+class ResultStore:
+    # Win counts and stats of tournament shards (see run_shard), appended to a JSON lines file as shards finish
+    # Tournaments given a store skip the shards it already holds, so interrupted or widened sweeps only play
+    # the missing shards; results of several runs writing to the same file are merged when it is read
+    def __init__(self, path):
+        self.path = path
+        self.shards = dict()
+        self._needs_newline = False
+        if os.path.exists(path):
+            self._read()
+
+    def _read(self):
+        with open(self.path) as f:
+            for line in f:
+                self._needs_newline = not line.endswith('\n')
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Last line of a run that was killed while writing
+                    continue
+                self.shards[record['key']] = record
+
+    def get(self, key):
+        # (num_games, wins, stats) of a stored shard, or None
+        record = self.shards.get(key)
+        if record is None:
+            return None
+        return record['num_games'], record['wins'], CantStopStats.from_dict(record['stats'])
+
+    def add(self, key, num_games, wins, stats):
+        record = {'key': key, 'num_games': int(num_games), 'wins': [int(w) for w in wins], 'stats': stats.to_dict()}
+        self.shards[key] = record
+        with open(self.path, 'a') as f:
+            if self._needs_newline:
+                f.write('\n')
+                self._needs_newline = False
+            f.write(json.dumps(record) + '\n')
+
+    def __contains__(self, key):
+        return key in self.shards
+
+    def __len__(self):
+        return len(self.shards)
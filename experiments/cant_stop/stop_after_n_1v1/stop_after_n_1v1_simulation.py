@@ -1,46 +1,46 @@
-from environments.cant_stop import CantStopEnv
 from policies.cant_stop import StopAfterNRollsPolicy
+from experiments.cant_stop import ResultStore, run_adaptive_tournament
 
 from itertools import combinations
-from collections import Counter
-import pandas as pd
+from functools import partial
+import os
 
 N_MIN = 10
 N_MAX = 16
 
-N_SIMULATIONS = 100
-
-unequal_pairs = set(combinations(range(N_MIN, N_MAX+1), 2))
-equal_pairs = {(i, i) for i in range(N_MIN, N_MAX+1)}
-duels = list(sorted(unequal_pairs.union(equal_pairs)))
-
-results = []
-for duel in duels:
-    print(f"{duel} ...")
-    win_counter = Counter({player: 0 for player in range(2)})
-    for _ in range(N_SIMULATIONS):
-        env = CantStopEnv(num_players=2)
-        policies = [StopAfterNRollsPolicy(n) for n in duel]
-
-        obs, info = env.reset()
-        done = False
-
-        while not done:
-            current_player = obs['current_player']
-            current_policy = policies[current_player]
-
-            possible_actions = env.get_possible_actions()
-            action = current_policy.select_action(possible_actions)
-
-            obs, reward, terminated, truncated, info = env.step(action)
-            done = terminated or truncated
-        win_counter.update([env.winner])
-
-    p1_win_rate = win_counter[0] / N_SIMULATIONS
-    p2_win_rate = win_counter[1] / N_SIMULATIONS
-
-    duel_result = (duel[0], duel[1], p1_win_rate, p2_win_rate)
-    results.append(duel_result)
-
-results_df = pd.DataFrame.from_records(results, columns=['p1_n', 'p2_n', 'p1_win_rate', 'p2_win_rate'])
-print(results_df)
\ No newline at end of file
+# Duels are played in rounds until the win rate is significantly different from 50% or its confidence interval
+# is narrower than TARGET_WIDTH, for at most MAX_SIMULATIONS games
+MAX_SIMULATIONS = 2000
+ROUND_SIMULATIONS = 100
+TARGET_WIDTH = 0.1
+CONFIDENCE = 0.99
+GAMES_PER_SHARD = 25
+SEED = 0
+
+# Shard results are kept here, so reruns (e.g. with a wider N range) only play the games not played before
+RESULTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stop_after_n_1v1_results.jsonl')
+
+# Mirror duels (i, i) are left out, their win rates are 50% by symmetry
+duels = list(sorted(combinations(range(N_MIN, N_MAX+1), 2)))
+
+if __name__ == '__main__':
+    results_df = run_adaptive_tournament(
+        duels={duel: [partial(StopAfterNRollsPolicy, n) for n in duel] for duel in duels},
+        max_games=MAX_SIMULATIONS,
+        round_games=ROUND_SIMULATIONS,
+        games_per_shard=GAMES_PER_SHARD,
+        target_width=TARGET_WIDTH,
+        confidence=CONFIDENCE,
+        common_random_numbers=True,
+        seed=SEED,
+        store=ResultStore(RESULTS_PATH),
+    )
+
+    results_df[['p1_n', 'p2_n']] = results_df['duel'].tolist()
+    results_df = results_df[[
+        'p1_n', 'p2_n', 'games', 'resolved',
+        'p1_win_rate', 'p1_ci_low', 'p1_ci_high',
+        'p2_win_rate', 'p2_ci_low', 'p2_ci_high'
+    ]]
+    print(results_df)
+    print(f"Total games: {results_df['games'].sum()}")
@@ -0,0 +1,242 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from statistics import NormalDist
+import hashlib
+import json
+import os
+import pickle
+
+import numpy as np
+
+from environments.cant_stop import CantStopEnv
+from environments.cant_stop.cant_stop_stats import CantStopStats
+from .result_store import get_policy_config, get_shard_key
+
+
+# Environments are built once per worker process and reused for every game of every shard
+# Tournaments only need the winners and stats, so nothing is recorded and policy actions are not validated
+_worker_envs = {}
+
+
+def _get_env(num_players):
+    if num_players not in _worker_envs:
+        _worker_envs[num_players] = CantStopEnv(num_players=num_players, history_mode='none', check_actions=False)
+    return _worker_envs[num_players]
+
+
+def run_shard(duel_index, policy_factories, seed, num_games, seed_every_game=False):
+    # Work unit: play num_games games of one duel, seeded deterministically from the shard seed
+    # The environment is seeded for the first game and keeps drawing from its generator for the following ones,
+    # unless seed_every_game: then every game gets its own seed, so the starting player and first dice of a game
+    # don't depend on how the previous games of the shard went
+    env_seed, *policy_seeds = np.random.SeedSequence(seed).generate_state(1 + len(policy_factories)).tolist()
+
+    env = _get_env(len(policy_factories))
+    policies = [factory(seed=policy_seed) for factory, policy_seed in zip(policy_factories, policy_seeds)]
+
+    stats = CantStopStats(len(policy_factories))
+    if seed_every_game:
+        wins = np.zeros(shape=len(policy_factories), dtype=np.int64)
+        for game_seed in np.random.SeedSequence(env_seed).generate_state(num_games).tolist():
+            wins[env.simulate_game(policies, seed=game_seed)] += 1
+            stats += env.stats
+    else:
+        wins = env.simulate_games(policies, num_games, seed=env_seed, stats=stats)
+
+    return duel_index, num_games, wins, stats
+
+
+def run_shards(executor, work_units, store=None):
+    # Results of run_shard for every work unit, in the order they finish
+    # With a ResultStore, shards it already holds are not played again and new results are added to it
+    futures = dict()
+    for duel_index, policy_factories, seed, num_games, seed_every_game in work_units:
+        key = None
+        if store is not None:
+            key = get_shard_key(policy_factories, seed, num_games, seed_every_game)
+            stored = store.get(key)
+            if stored is not None:
+                yield (duel_index, *stored)
+                continue
+        future = executor.submit(run_shard, duel_index, policy_factories, seed, num_games, seed_every_game)
+        futures[future] = key
+
+    for future in as_completed(futures):
+        duel_index, num_games, wins, stats = future.result()
+        if store is not None:
+            store.add(futures[future], num_games, wins, stats)
+        yield duel_index, num_games, wins, stats
+
+
+def get_duel_key(policy_factories):
+    # Stable identity of a duel from its policies (see get_policy_config), independent of its position in
+    # the duels dict, so widening or reordering a sweep doesn't change the seeds (and store keys) of its shards
+    config = json.dumps([get_policy_config(factory) for factory in policy_factories], sort_keys=True)
+    return int.from_bytes(hashlib.sha256(config.encode()).digest()[:8], 'little')
+
+
+def get_shard_seeds(seed, duel_key, num_shards):
+    # Seeds depend only on (seed, duel, shard), not on the worker a shard runs on
+    # duel_key: see get_duel_key, None = seeds shared by all duels (common random numbers)
+    spawn_key = () if duel_key is None else (duel_key,)
+    seed_sequence = np.random.SeedSequence(seed, spawn_key=spawn_key)
+    return [int(s.generate_state(1)[0]) for s in seed_sequence.spawn(num_shards)]
+
+
+def wilson_interval(wins, games, confidence=0.95):
+    # Wilson score interval of a win rate
+    if games == 0:
+        return 0.0, 1.0
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    p = wins / games
+    denominator = 1 + z ** 2 / games
+    centre = (p + z ** 2 / (2 * games)) / denominator
+    half_width = z * np.sqrt(p * (1 - p) / games + z ** 2 / (4 * games ** 2)) / denominator
+    return centre - half_width, centre + half_width
+
+
+def run_tournament(duels, num_games, games_per_shard=500, num_workers=None, seed=0, confidence=0.95, verbose=True,
+                   collect_stats=False, store=None):
+    # duels: dict of duel name -> list of picklable policy factories (one per player), which are called
+    #   with a seed keyword argument, e.g.
+    #   {(10, 12): [partial(StopAfterNRollsPolicy, 10), partial(StopAfterNRollsPolicy, 12)]}
+    # Every duel is split into shards of games_per_shard games, which are played on a process pool
+    # With collect_stats, also returns a dict of duel name -> CantStopStats merged over all games of the duel
+    # store: ResultStore to skip shards computed by earlier runs and save the new ones
+    duel_names = list(duels)
+    num_shards = -(-num_games // games_per_shard)
+
+    work_units = []
+    for duel_index, name in enumerate(duel_names):
+        seeds = get_shard_seeds(seed, get_duel_key(duels[name]), num_shards)
+        for shard in range(num_shards):
+            shard_games = min(games_per_shard, num_games - shard * games_per_shard)
+            work_units.append((duel_index, duels[name], seeds[shard], shard_games, False))
+
+    games = np.zeros(shape=len(duel_names), dtype=np.int64)
+    wins = {name: np.zeros(shape=len(duels[name]), dtype=np.int64) for name in duel_names}
+    stats = {name: CantStopStats(len(duels[name])) for name in duel_names}
+
+    num_workers = num_workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        # Merge win counts as shards finish
+        for duel_index, shard_games, shard_wins, shard_stats in run_shards(executor, work_units, store):
+            games[duel_index] += shard_games
+            wins[duel_names[duel_index]] += shard_wins
+            stats[duel_names[duel_index]] += shard_stats
+
+            if verbose and games[duel_index] == num_games:
+                print(f"{duel_names[duel_index]} done")
+
+    results_df = get_results(duel_names, games, wins, confidence)
+    if collect_stats:
+        return results_df, stats
+    return results_df
+
+
+def is_mirror_duel(policy_factories):
+    # Duel of identical policies (e.g. StopAfterNRollsPolicy(12) against itself), whose win rates are known up front
+    return len({pickle.dumps(factory) for factory in policy_factories}) == 1
+
+
+def is_resolved(player_wins, games, num_players, confidence=0.95, target_width=None, resolve_significant=True,
+                num_looks=1):
+    # Whether the confidence interval of the first player's win rate is narrower than target_width,
+    # or (resolve_significant) excludes the win rate of equally strong players
+    # num_looks: number of times a duel may be tested; the significance test runs at the Bonferroni-corrected
+    #   confidence 1 - (1 - confidence) / num_looks, so equally strong players are found different with
+    #   probability at most 1 - confidence over all looks
+    ci_low, ci_high = wilson_interval(player_wins, games, confidence)
+    if target_width is not None and ci_high - ci_low <= target_width:
+        return True
+    if not resolve_significant:
+        return False
+    ci_low, ci_high = wilson_interval(player_wins, games, 1 - (1 - confidence) / num_looks)
+    return ci_low > 1 / num_players or ci_high < 1 / num_players
+
+
+def run_adaptive_tournament(duels, max_games, round_games=500, games_per_shard=500, target_width=None,
+                            resolve_significant=True, common_random_numbers=False, skip_mirror_duels=True,
+                            num_workers=None, seed=0, confidence=0.95, verbose=True, collect_stats=False, store=None):
+    # Sequential version of run_tournament: duels are played in rounds of round_games games, and after every round
+    # only duels that aren't resolved yet (see is_resolved) keep playing, up to max_games games each
+    # Every round is a new look at the data, so the significance test is corrected for the number of rounds
+    # (see is_resolved): with confidence=0.99, a look every 100 games and max_games=2000, equally strong policies
+    # are resolved in 0.4% of duels (1.1% for a single look at 2000 games, 6.8% without the correction; simulated
+    # with 4000 duels of coin flips)
+    # common_random_numbers: game g of every duel uses the same seeds (starting player, dice), so differences
+    #   between duels come from the policies rather than from luck
+    # skip_mirror_duels: duels of identical policies are not played (0 games in the results)
+    # store: see run_tournament
+    # Returns the results of get_results with an additional 'resolved' column
+    assert target_width is not None or resolve_significant, 'Set target_width or resolve_significant'
+    duel_names = list(duels)
+    max_shards = -(-max_games // games_per_shard)
+    shards_per_round = max(1, round_games // games_per_shard)
+    num_looks = -(-max_shards // shards_per_round)
+
+    # With common random numbers all duels share the same shard seeds
+    shard_seeds = [
+        get_shard_seeds(seed, None if common_random_numbers else get_duel_key(duels[name]), max_shards)
+        for name in duel_names
+    ]
+
+    games = np.zeros(shape=len(duel_names), dtype=np.int64)
+    wins = {name: np.zeros(shape=len(duels[name]), dtype=np.int64) for name in duel_names}
+    stats = {name: CantStopStats(len(duels[name])) for name in duel_names}
+    resolved = np.zeros(shape=len(duel_names), dtype=bool)
+
+    active = [
+        duel_index for duel_index, name in enumerate(duel_names)
+        if not (skip_mirror_duels and is_mirror_duel(duels[name]))
+    ]
+
+    num_workers = num_workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        first_shard = 0
+        while active and first_shard < max_shards:
+            shards = range(first_shard, min(first_shard + shards_per_round, max_shards))
+            work_units = [
+                (duel_index, duels[duel_names[duel_index]], shard_seeds[duel_index][shard],
+                 min(games_per_shard, max_games - shard * games_per_shard), common_random_numbers)
+                for duel_index in active for shard in shards
+            ]
+            for duel_index, shard_games, shard_wins, shard_stats in run_shards(executor, work_units, store):
+                games[duel_index] += shard_games
+                wins[duel_names[duel_index]] += shard_wins
+                stats[duel_names[duel_index]] += shard_stats
+            first_shard = shards.stop
+
+            for duel_index in active:
+                name = duel_names[duel_index]
+                resolved[duel_index] = is_resolved(
+                    wins[name][0], games[duel_index], len(duels[name]), confidence, target_width, resolve_significant,
+                    num_looks
+                )
+            active = [duel_index for duel_index in active if not resolved[duel_index]]
+            if verbose:
+                print(f"{games.sum()} games played, {len(active)} duels unresolved")
+
+    results_df = get_results(duel_names, games, wins, confidence)
+    results_df['resolved'] = resolved
+    if collect_stats:
+        return results_df, stats
+    return results_df
+
+
+def get_results(duel_names, games, wins, confidence=0.95):
+    # One row per duel with win counts, win rates and confidence intervals for every player
+    # pandas is imported here so worker processes don't load it
+    import pandas as pd
+
+    records = []
+    for duel_index, name in enumerate(duel_names):
+        record = {'duel': name, 'games': int(games[duel_index])}
+        for player, player_wins in enumerate(wins[name]):
+            ci_low, ci_high = wilson_interval(player_wins, games[duel_index], confidence)
+            record[f'p{player + 1}_wins'] = int(player_wins)
+            record[f'p{player + 1}_win_rate'] = player_wins / games[duel_index] if games[duel_index] else np.nan
+            record[f'p{player + 1}_ci_low'] = ci_low
+            record[f'p{player + 1}_ci_high'] = ci_high
+        records.append(record)
+
+    return pd.DataFrame.from_records(records)
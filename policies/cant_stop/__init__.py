@@ -1,4 +1,8 @@
 from .cant_stop_random_policy import CantStopRandomPolicy
 from .stop_after_n_rolls_policy import StopAfterNRollsPolicy
+from .cant_stop_batch_random_policy import CantStopBatchRandomPolicy
+from .stop_after_n_rolls_batch_policy import StopAfterNRollsBatchPolicy
+from .mcts_policy import MCTSPolicy
+from .transposition_table import TranspositionTable
 
-__all__ = ['CantStopRandomPolicy', 'StopAfterNRollsPolicy']
\ No newline at end of file
+__all__ = ['CantStopRandomPolicy', 'StopAfterNRollsPolicy', 'CantStopBatchRandomPolicy', 'StopAfterNRollsBatchPolicy', 'MCTSPolicy', 'TranspositionTable']
\ No newline at end of file
@@ -0,0 +1,32 @@
+import numpy as np
+
+
+def choose_actions(rng, rows, actions, num_rows):
+    # One uniformly random action per row, from (row, action) pairs sorted by row (e.g. from np.nonzero of a mask)
+    # Only the pairs are touched, not whole mask rows; rows without actions (e.g. games that have ended) get action 0
+    draws = rng.random(num_rows)
+    if len(actions) == 0:
+        return np.zeros(shape=num_rows, dtype=np.int64)
+    counts = np.bincount(rows, minlength=num_rows)
+    choices = np.cumsum(counts) - counts + (draws * counts).astype(np.int64)
+    return np.where(counts > 0, actions[np.minimum(choices, len(actions) - 1)], 0)
+
+
+def choose_legal_actions(rng, legal_mask_batch):
+    # One uniformly random legal action per row of a boolean (num_games, NUM_ACTIONS) mask
+    rows, actions = np.nonzero(legal_mask_batch)
+    return choose_actions(rng, rows, actions, len(legal_mask_batch))
+
+
+class CantStopBatchRandomPolicy:
+    # Batched counterpart to CantStopRandomPolicy, e.g. for CantStopBatchEnv
+    # select_actions gets the observations and legal action masks of many games (one row per game)
+    # and returns one integer action per game
+    def __init__(self, seed=None):
+        self.rng = np.random.default_rng(seed)
+
+    def reset(self, num_games, games=None):
+        pass
+
+    def select_actions(self, obs_batch, legal_mask_batch, games=None):
+        return choose_legal_actions(self.rng, legal_mask_batch)
@@ -1,8 +1,8 @@
 import random
 
 class CantStopRandomPolicy:
-    def __init__(self):
-        pass
+    def __init__(self, seed=None):
+        self.random = random.Random(seed)
 
     def select_action(self, possible_actions):
-        return random.choice(possible_actions)
\ No newline at end of file
+        return self.random.choice(possible_actions)
\ No newline at end of file
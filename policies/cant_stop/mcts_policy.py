@@ -0,0 +1,229 @@
+from concurrent.futures import ProcessPoolExecutor
+import math
+import random
+import time
+
+import numpy as np
+
+from environments.cant_stop.cant_stop_state import COLUMN_LENGTHS
+from .cant_stop_random_policy import CantStopRandomPolicy
+
+
+class DecisionNode:
+    # State in which `player` chooses an action; children are the chance nodes following each action
+    __slots__ = ('player', 'untried_actions', 'children', 'visits')
+
+    def __init__(self, player, actions):
+        self.player = player
+        self.untried_actions = list(actions)
+        self.children = dict()
+        self.visits = 0
+
+
+class ChanceNode:
+    # Outcome of an action: the next dice roll decides which decision node follows
+    __slots__ = ('outcomes', 'visits', 'wins')
+
+    def __init__(self):
+        self.outcomes = dict()
+        self.visits = 0
+        self.wins = 0.0
+
+
+def get_state_key(state):
+    # Game-relevant part of a CantStopState (turn and move counters don't change the game):
+    # the Zobrist hash of markers and current player, and the roll
+    return state.hash, state.roll
+
+
+def evaluate(state):
+    # Heuristic winner of an unfinished game: player with the most progress on their best 3 columns
+    progress = (state.player_markers + 1) / COLUMN_LENGTHS
+    best_progress = np.sort(progress, axis=1)[:, -3:].sum(axis=1)
+    return int(np.argmax(best_progress))
+
+
+def rollout(env, policy, max_steps=None):
+    # Play from the current state of env until the game ends (or max_steps are taken) and return the winner
+    if hasattr(policy, 'reset'):
+        policy.reset()
+
+    steps = 0
+    while env.state.winner is None:
+        if max_steps is not None and steps >= max_steps:
+            return evaluate(env.state)
+        env.step(policy.select_action(env.get_possible_actions()))
+        steps += 1
+
+    return env.state.winner
+
+
+# Serial MCTSPolicy of search worker processes
+_worker = dict()
+
+
+def _init_worker(env, policy_kwargs):
+    _worker['policy'] = MCTSPolicy(env, **policy_kwargs)
+
+
+def _run_worker_search(root_state, seed):
+    # Independent search from root_state, seeded by the task (not the worker process), so results don't depend
+    # on which worker runs a search; returns the visits of every root action
+    policy = _worker['policy']
+    policy.random.seed(seed)
+    policy.rollout_policy = policy.rollout_policy_factory(seed=policy.random.getrandbits(32))
+    policy.sim_env.reset(seed=policy.random.getrandbits(32))
+    policy.nodes = dict()
+    root = policy._search_root(root_state)
+    return {action: chance.visits for action, chance in root.children.items()}
+
+
+class MCTSPolicy:
+    def __init__(self, env, iterations=1000, time_limit=None, exploration=1.4, reuse_tree=False,
+                 rollout_policy_factory=CantStopRandomPolicy, max_rollout_steps=200,
+                 num_workers=0, max_nodes=1_000_000, max_depth=1000, seed=None):
+        # env: the environment the policy plays in, its state is read on every decision
+        # iterations / time_limit: search budget per move, search stops when either is used up (None = no limit)
+        # reuse_tree: keep the search tree between moves and continue from the node matching the new state
+        # rollout_policy_factory: called with a seed keyword argument to create rollout policies
+        # num_workers: if > 0, every worker process searches its own tree from the current state with the full
+        #   budget (root parallelization) and the root visits of all workers are added up; one task per worker
+        #   and move, so the per-move latency stays time_limit plus the cost of sending the state
+        assert iterations is not None or time_limit is not None, 'Either iterations or time_limit has to be set'
+        assert not (reuse_tree and num_workers > 0), 'Trees are not reused when searching on worker processes'
+        self.env = env
+        self.iterations = iterations
+        self.time_limit = time_limit
+        self.exploration = exploration
+        self.reuse_tree = reuse_tree
+        self.max_rollout_steps = max_rollout_steps
+        self.max_nodes = max_nodes
+        self.max_depth = max_depth
+        self.num_workers = num_workers
+
+        self.random = random.Random(seed)
+        self.rollout_policy_factory = rollout_policy_factory
+        self.rollout_policy = rollout_policy_factory(seed=self.random.getrandbits(32))
+        self.sim_env = env.clone(history_mode='none')
+
+        self.executor = None
+        if num_workers > 0:
+            policy_kwargs = dict(
+                iterations=iterations, time_limit=time_limit, exploration=exploration,
+                rollout_policy_factory=rollout_policy_factory, max_rollout_steps=max_rollout_steps,
+                max_nodes=max_nodes, max_depth=max_depth
+            )
+            self.executor = ProcessPoolExecutor(
+                max_workers=num_workers,
+                initializer=_init_worker,
+                initargs=(self.sim_env, policy_kwargs)
+            )
+
+        self.nodes = dict()
+
+    def reset(self):
+        self.nodes = dict()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def select_action(self, possible_actions):
+        if len(possible_actions) == 1:
+            return possible_actions[0]
+
+        root_state = self.env.get_state()
+        if self.executor is not None:
+            seeds = [self.random.getrandbits(32) for _ in range(self.num_workers)]
+            visits = dict()
+            for worker_visits in self.executor.map(_run_worker_search, [root_state] * self.num_workers, seeds):
+                for action, action_visits in worker_visits.items():
+                    visits[action] = visits.get(action, 0) + action_visits
+        else:
+            if not self.reuse_tree or len(self.nodes) > self.max_nodes:
+                self.nodes = dict()
+            root = self._search_root(root_state)
+            visits = {action: chance.visits for action, chance in root.children.items()}
+
+        # Play the most visited action
+        best_action = max(visits, key=visits.get)
+        return next(action for action in possible_actions if action == best_action)
+
+    def _search_root(self, root_state):
+        # Search from root_state until the budget is used up and return the root node
+        self.sim_env.set_state(root_state)
+        root, _ = self._get_node(root_state)
+
+        start = time.perf_counter()
+        iteration = 0
+        while True:
+            if self.iterations is not None and iteration >= self.iterations:
+                break
+            if self.time_limit is not None and time.perf_counter() - start >= self.time_limit:
+                break
+            self._search(root, root_state)
+            iteration += 1
+
+        return root
+
+    def _get_node(self, state):
+        # Nodes are shared between all paths leading to the same state
+        # Returns the node and whether it was newly created; the simulation environment has to be in `state`
+        key = get_state_key(state)
+        node = self.nodes.get(key)
+        if node is not None:
+            return node, False
+
+        node = DecisionNode(state.current_player, self.sim_env.get_possible_actions())
+        self.nodes[key] = node
+        return node, True
+
+    def _search(self, root, root_state):
+        sim_env = self.sim_env
+        sim_env.set_state(root_state)
+
+        node = root
+        path = []
+        winner = None
+        while len(path) < self.max_depth:
+            if node.untried_actions:
+                # Expansion
+                action = node.untried_actions.pop(self.random.randrange(len(node.untried_actions)))
+                chance = ChanceNode()
+                node.children[action] = chance
+            else:
+                # Selection (UCT)
+                log_visits = math.log(node.visits)
+                action, chance = max(
+                    node.children.items(),
+                    key=lambda item: self._uct(item[1], log_visits)
+                )
+
+            path.append((node, chance))
+            _, _, terminated, _, _ = sim_env.step(action)
+
+            if terminated:
+                winner = sim_env.state.winner
+                break
+
+            # Chance node: the roll made by the environment decides the next decision node
+            next_node = chance.outcomes.get(sim_env.state.roll)
+            if next_node is None:
+                next_node, is_new = self._get_node(sim_env.state)
+                chance.outcomes[sim_env.state.roll] = next_node
+                if is_new:
+                    break
+            node = next_node
+
+        if winner is None:
+            winner = rollout(sim_env, self.rollout_policy, self.max_rollout_steps)
+
+        # Backpropagation: each chance node stores the wins of the player who chose its action
+        for node, chance in path:
+            node.visits += 1
+            chance.visits += 1
+            chance.wins += winner == node.player
+
+    def _uct(self, chance, log_visits):
+        return chance.wins / chance.visits + self.exploration * math.sqrt(log_visits / chance.visits)
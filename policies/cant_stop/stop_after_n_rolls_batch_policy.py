@@ -0,0 +1,42 @@
+import numpy as np
+
+from .cant_stop_batch_random_policy import choose_actions
+
+
+class StopAfterNRollsBatchPolicy:
+    # Batched counterpart to StopAfterNRollsPolicy: the rolls of the current turn are counted per game
+    # games: indices (or boolean mask) of the games the rows of select_actions belong to, None = all games
+    def __init__(self, n, seed=None):
+        assert n >= 1, 'n has to be 1 or larger'
+        self.n = n
+        self.rng = np.random.default_rng(seed)
+        self.current_rolls = None
+
+    def reset(self, num_games, games=None):
+        # Starts at 1 because at start of player's turn one dice roll happens by default
+        if games is None:
+            self.current_rolls = np.ones(shape=num_games, dtype=np.int64)
+        else:
+            self.current_rolls[games] = 1
+
+    def select_actions(self, obs_batch, legal_mask_batch, games=None):
+        assert self.current_rolls is not None, 'Call reset(num_games) first'
+        current_rolls = self.current_rolls if games is None else self.current_rolls[games]
+
+        # Odd actions continue, even actions stop (0 = bust)
+        num_games = len(legal_mask_batch)
+        rows, actions = np.nonzero(legal_mask_batch)
+        continue_actions = actions % 2 == 1
+
+        # Continue if the max number of rolls hasn't been reached and continuing is possible, else stop or bust
+        can_continue = np.bincount(rows[continue_actions], minlength=num_games) > 0
+        continue_games = (current_rolls < self.n) & can_continue
+        selected = continue_actions == continue_games[rows]
+        actions = choose_actions(self.rng, rows[selected], actions[selected], num_games)
+
+        current_rolls = np.where(continue_games, current_rolls + 1, 1)
+        if games is None:
+            self.current_rolls = current_rolls
+        else:
+            self.current_rolls[games] = current_rolls
+        return actions
@@ -1,12 +1,27 @@
 import random
 
+
+def is_continue_action(action):
+    # Tuple actions (columns, continue_flag), or integer actions of discrete mode: odd actions continue
+    # (see cant_stop_tables.decode_action)
+    if isinstance(action, tuple):
+        return action[1] == True
+    return action % 2 == 1
+
+
 class StopAfterNRollsPolicy:
-    def __init__(self, n):
+    def __init__(self, n, seed=None):
         assert n >= 1, 'n has to be 1 or larger'
         self.n = n
+        self.random = random.Random(seed)
         self.current_rolls = 1 # Starts at 1 because at start of player's turn one dice roll happens by default
 
 
+    @property
+    def stop_after_rolls(self):
+        # Declared decision rule: CantStopEnv.play_turn runs turns of this policy without calling select_action
+        return self.n
+
     def reset(self):
         self.current_rolls = 1
 
@@ -15,15 +30,15 @@ class StopAfterNRollsPolicy:
         # Stop if max number of rolls has been reached
         if self.current_rolls >= self.n:
             self.reset()
-            stop_actions = [action for action in possible_actions if action[1] == False]
-            return random.choice(stop_actions)
+            stop_actions = [action for action in possible_actions if not is_continue_action(action)]
+            return self.random.choice(stop_actions)
 
         # Otherwise continue if possible
-        continue_actions = [action for action in possible_actions if action[1] == True]
+        continue_actions = [action for action in possible_actions if is_continue_action(action)]
         if continue_actions:
             self.current_rolls += 1
-            return random.choice(continue_actions)
+            return self.random.choice(continue_actions)
 
         # Else bust
         self.reset()
-        return random.choice(possible_actions)
+        return self.random.choice(possible_actions)
@@ -0,0 +1,62 @@
+class TranspositionTable:
+    # Fixed-size table of position values keyed by CantStopState.hash, e.g. to memoize evaluations in a search
+    # Each key maps to a single slot (hash modulo size); when two positions share a slot, the stored entry is
+    # replaced if it belongs to an older generation (see new_generation) or if the new entry has at least its weight
+    # (e.g. search depth or number of visits), so entries which took more work to compute are kept
+    def __init__(self, size=1 << 20):
+        assert size > 0 and size & (size - 1) == 0, 'size has to be a power of 2'
+        self.size = size
+        self._mask = size - 1
+        self._keys = [None] * size
+        self._values = [None] * size
+        self._weights = [0] * size
+        self._generations = [0] * size
+        self.generation = 0
+        self.num_entries = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        slot = key & self._mask
+        if self._keys[slot] == key:
+            self.hits += 1
+            return self._values[slot]
+        self.misses += 1
+        return default
+
+    def store(self, key, value, weight=0):
+        # Returns whether the value was stored
+        slot = key & self._mask
+        stored_key = self._keys[slot]
+        if stored_key is None:
+            self.num_entries += 1
+        elif (stored_key != key and self._generations[slot] == self.generation
+              and weight < self._weights[slot]):
+            return False
+
+        self._keys[slot] = key
+        self._values[slot] = value
+        self._weights[slot] = weight
+        self._generations[slot] = self.generation
+        return True
+
+    def new_generation(self):
+        # Entries stored so far can be replaced by any new entry, but stay available until then
+        # (e.g. call before every search, so the table fills with positions of the current search)
+        self.generation += 1
+
+    def clear(self):
+        self._keys = [None] * self.size
+        self._values = [None] * self.size
+        self._weights = [0] * self.size
+        self._generations = [0] * self.size
+        self.generation = 0
+        self.num_entries = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key):
+        return self._keys[key & self._mask] == key
+
+    def __len__(self):
+        return self.num_entries